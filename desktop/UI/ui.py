@@ -16,6 +16,7 @@ from PySide6.QtWidgets import (QApplication, QCheckBox, QComboBox, QGridLayout,
     QHBoxLayout, QLabel, QLineEdit, QMainWindow,
     QPushButton, QScrollArea, QSizePolicy, QTextBrowser,
     QTextEdit, QVBoxLayout, QWidget)
+from core.pattern_taxonomy import PATTERN_OPTIONS
 
 class Ui_MainWindow(object):
     """
@@ -628,20 +629,8 @@ class Ui_MainWindow(object):
 
     def _populate_fingerprint_pattern_dropdown(self):
         """Populate fingerprint pattern dropdown"""
-        pattern_options = [
-            "Select Fingerprint Pattern",
-            "Plain Arch",
-            "Tented Arch", 
-            "Ulnar Loop",
-            "Radial Loop",
-            "Plain Whorl",
-            "Central Pocket Loop Whorl",
-            "Double Loop Whorl",
-            "Accidental Whorl",
-            "Spiral Whorl",
-            "Composite Whorl",
-            "Unclear/Damaged Print"
-        ]
+        # Labels come from the taxonomy shared with the model training code
+        pattern_options = ["Select Fingerprint Pattern"] + PATTERN_OPTIONS
         for option in pattern_options:
             self.fingerprintPatternComboBox.addItem(option)
 
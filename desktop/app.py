@@ -1,11 +1,37 @@
 import sys
-from PySide6.QtWidgets import QApplication
-from windows.main_window import MainWindow
+import time
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor, QPixmap
+from PySide6.QtWidgets import QApplication, QSplashScreen
+from utils.import_timing import timed_import, format_import_times
 
 if __name__ == "__main__":
+    start = time.perf_counter()
     app = QApplication(sys.argv)
+
+    # Splash first, so something is on screen while the window is built
+    pixmap = QPixmap(420, 200)
+    pixmap.fill(QColor("#1e293b"))
+    splash = QSplashScreen(pixmap)
+    splash.showMessage("🖐️ Starting fingerprint capture…", Qt.AlignBottom | Qt.AlignHCenter, QColor("#e2e8f0"))
+    splash.show()
+    app.processEvents()
+
+    MainWindow = timed_import("windows.main_window").MainWindow
     window = MainWindow()
     window.show()
+    splash.finish(window)
+    print(f"🪟 Window shown in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # torch and the model load in the background; the status bar shows progress
+    from core.preloader import BackgroundPreloader
+    # Kept on the window so closeEvent can wait for it to finish
+    preloader = window.preloader = BackgroundPreloader(window.session_classifier, parent=window)
+    preloader.progress.connect(lambda message, done, total: window.statusBar().showMessage(
+        message if done < total else "Ready", 0 if done < total else 3000))
+    preloader.finished_loading.connect(lambda failures: print(format_import_times()))
+    preloader.start()
+
     sys.exit(app.exec())
 
 # # main.py
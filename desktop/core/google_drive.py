@@ -1,10 +1,6 @@
 from __future__ import print_function
 import os
 import pickle
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 
 # =========================
 # CONFIGURATION
@@ -16,6 +12,11 @@ LOCAL_FOLDER = r'C:\Users\athar\OneDrive\Desktop\Atharva\Lata-Mangeshkar\fingerp
 # =========================
 
 def get_service():
+    # Google client libraries are slow to import; only pay for them when uploading
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
     if os.path.exists('token.pickle'):
         with open('token.pickle', 'rb') as token:
@@ -31,6 +32,8 @@ def get_service():
     return build('drive', 'v3', credentials=creds)
 
 def upload_to_drive(file_path, service):
+    from googleapiclient.http import MediaFileUpload
+
     file_name = os.path.basename(file_path)
     file_metadata = {'name': file_name, 'parents': [FOLDER_ID]}
     media = MediaFileUpload(file_path, resumable=True)
@@ -0,0 +1,89 @@
+import os
+import threading
+from PySide6.QtCore import QThread, Signal
+from .pattern_taxonomy import MODEL_DIR, COARSE_CLASSES
+
+# Trainer writes model_weights/best_model_<run id>.pth under the directory it runs in
+WEIGHTS_DIR = os.path.join(MODEL_DIR, "model_weights")
+
+
+def latest_checkpoint(weights_dir=WEIGHTS_DIR):
+    """Most recently written best_model_*.pth, or None if no run has finished an epoch yet"""
+    if not os.path.isdir(weights_dir):
+        return None
+    checkpoints = [os.path.join(weights_dir, name) for name in os.listdir(weights_dir)
+                   if name.startswith("best_model_") and name.endswith(".pth")]
+    return max(checkpoints, key=os.path.getmtime, default=None)
+
+
+class SessionClassifier:
+    """Classifies all pending fingers of a patient session in a single forward pass.
+
+    The model is loaded on first use, so the app starts (and keeps working)
+    without torch or a trained checkpoint; ``available`` reports whether
+    predictions can be made.
+    """
+    def __init__(self, model_path=None, device='cpu'):
+        self.model_path = model_path
+        self.device = device
+        self.model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()  # the startup preloader and inference workers may race to load
+
+    @property
+    def available(self):
+        return self._ensure_model() is not None
+
+    def _ensure_model(self):
+        with self._load_lock:
+            return self._load_model()
+
+    def _load_model(self):
+        if self.model is not None or self._load_failed:
+            return self.model
+        if self.model_path is None:
+            self.model_path = latest_checkpoint()
+        if self.model_path is None or not os.path.exists(self.model_path):
+            print(f"⚠️ No pattern model found (looked for best_model_*.pth in {WEIGHTS_DIR})")
+            self._load_failed = True
+            return None
+        try:
+            from inference import load_model
+
+            self.model = load_model(self.model_path, num_classes=len(COARSE_CLASSES),
+                                    device=self.device, num_fine_classes=None)
+        except Exception as e:
+            print(f"❌ Could not load pattern model: {e}")
+            self.model = None
+        self._load_failed = self.model is None
+        return self.model
+
+    def classify_session(self, frames):
+        """Map {finger: grayscale frame} to {finger: prediction dict} with one batched forward"""
+        if not frames or self._ensure_model() is None:
+            return {}
+        from inference import preprocess_frames, predict_batch
+
+        fingers = list(frames)
+        batch = preprocess_frames([frames[finger] for finger in fingers])
+        results = predict_batch(self.model, batch, self.model.class_names, device=self.device)
+        return dict(zip(fingers, results))
+
+
+class SessionInferenceWorker(QThread):
+    """Runs SessionClassifier.classify_session off the UI thread"""
+    results_ready = Signal(dict)
+
+    def __init__(self, classifier, frames, parent=None):
+        super().__init__(parent)
+        self.classifier = classifier
+        self.frames = dict(frames)
+        self.results = {}
+
+    def run(self):
+        try:
+            self.results = self.classifier.classify_session(self.frames)
+        except Exception as e:
+            print(f"❌ Session inference failed: {e}")
+            self.results = {}
+        self.results_ready.emit(self.results)
@@ -0,0 +1,14 @@
+"""Pattern labels shared with the model code in models/main-pattern.
+
+The taxonomy lives next to the model so training, inference and this app
+can never disagree on label names or the fine→coarse mapping.
+"""
+import sys
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parents[2] / "models" / "main-pattern"
+if str(MODEL_DIR) not in sys.path:
+    sys.path.append(str(MODEL_DIR))
+
+from pattern_taxonomy import (COARSE_CLASSES, FINE_PATTERNS, FINE_PATTERN_PARENTS,
+                              UNCLEAR_PATTERN, PATTERN_OPTIONS, safe_pattern_name)
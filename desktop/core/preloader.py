@@ -0,0 +1,41 @@
+from PySide6.QtCore import QThread, Signal
+from utils.import_timing import timed_import
+
+# Heavy modules the window does not need to appear, in the order they are warmed up
+PRELOAD_MODULES = ["torch", "torchvision", "inference"]
+
+
+class BackgroundPreloader(QThread):
+    """Imports heavy modules and loads the pattern model after the window is shown.
+
+    Everything here is also imported lazily where it is used, so the app works
+    (just with a slower first use) if a module is missing or still loading.
+    """
+    progress = Signal(str, int, int)
+    finished_loading = Signal(dict)
+
+    def __init__(self, classifier=None, modules=PRELOAD_MODULES, parent=None):
+        super().__init__(parent)
+        self.classifier = classifier
+        self.modules = list(modules)
+        self.failures = {}
+
+    def run(self):
+        total = len(self.modules) + (self.classifier is not None)
+        for i, name in enumerate(self.modules):
+            if self.isInterruptionRequested():
+                return
+            self.progress.emit(f"Loading {name}…", i, total)
+            try:
+                timed_import(name)
+            except Exception as e:
+                self.failures[name] = f"{type(e).__name__}: {e}"
+
+        if self.isInterruptionRequested():
+            return
+        if self.classifier is not None:
+            self.progress.emit("Loading pattern model…", total - 1, total)
+            self.classifier.available
+
+        self.progress.emit("Ready", total, total)
+        self.finished_loading.emit(self.failures)
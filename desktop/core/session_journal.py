@@ -0,0 +1,153 @@
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import threading
+
+DEFAULT_JOURNAL_PATH = os.path.join("data", "session_journal.jsonl")
+
+_TRUNCATE = object()
+
+
+class SessionJournal:
+    """Append-only JSONL journal of the capture session, written by a background thread.
+
+    ``record`` only enqueues an event, so the UI thread never touches the disk.
+    The writer drains the queue in batches, collapsing repeated edits of the
+    same form field, and fsyncs once per batch (at most every
+    ``flush_interval`` seconds). A crash loses at most that last interval.
+    """
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, flush_interval=0.5):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="session-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, event, **fields):
+        if not self._closed:
+            self._queue.put({"event": event, "time": time.time(), **fields})
+
+    def reset(self, state=None, saved=False):
+        """Start a new journal; with ``state`` it begins with a snapshot of that session.
+
+        A ``saved`` snapshot is what is already on disk in patient.json: replay
+        only reports the session again once it differs from it.
+        """
+        if self._closed:
+            return
+        self._queue.put(_TRUNCATE)
+        if state is not None:
+            self.record("snapshot", state=state, saved=saved)
+
+    def flush(self):
+        """Block until everything recorded so far is fsynced"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                items = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while items[-1] is not None:
+                    try:
+                        items.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._write_batch(f, items)
+                except OSError as e:
+                    print(f"❌ Session journal write failed: {e}")
+                for _ in items:
+                    self._queue.task_done()
+                if items[-1] is None:
+                    return
+
+    @staticmethod
+    def _write_batch(f, items):
+        records = []
+        for item in items:
+            if item is _TRUNCATE:
+                f.seek(0)
+                f.truncate()
+                records = []
+            elif item is not None:
+                # Only the last value of a field within one batch matters
+                if item["event"] == "field" and records and records[-1]["event"] == "field" \
+                        and records[-1]["name"] == item["name"]:
+                    records[-1] = item
+                else:
+                    records.append(item)
+        f.writelines(json.dumps(record) + "\n" for record in records)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def replay(path=DEFAULT_JOURNAL_PATH):
+    """Rebuild the unsaved session from a journal, or None if there is nothing to resume.
+
+    Returns {"patient_uuid", "captured_fingers", "fields", "current_finger_index",
+    "previously_saved"}. A session whose state still equals its last saved
+    snapshot is not returned. A partially written last line (crash
+    mid-append) is ignored.
+    """
+    if not os.path.exists(path):
+        return None
+
+    state = {"patient_uuid": None, "captured_fingers": {}, "fields": {}, "current_finger_index": 0}
+    saved_state = None
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            event = record.get("event")
+            if event == "snapshot":
+                state = record["state"]
+                saved_state = copy.deepcopy(state) if record.get("saved") else None
+            elif event == "session":
+                state["patient_uuid"] = record["patient_uuid"]
+            elif event == "capture":
+                state["captured_fingers"][record["finger"]] = {"pattern": record["pattern"], "file": record["file"]}
+            elif event == "retake":
+                state["captured_fingers"].pop(record["finger"], None)
+            elif event == "field":
+                state["fields"][record["name"]] = record["value"]
+            elif event == "finger_index":
+                state["current_finger_index"] = record["index"]
+
+    if not (state["patient_uuid"] or state["captured_fingers"] or any(state["fields"].values())):
+        return None
+    # Moving between fingers is not saved data; a capture whose event was lost leaves an orphan image
+    if saved_state is not None and not orphaned_images(os.path.dirname(path) or ".", state) and \
+            {**state, "current_finger_index": 0} == {**saved_state, "current_finger_index": 0}:
+        return None
+    state["previously_saved"] = saved_state is not None
+    return state
+
+
+def orphaned_images(data_root, state):
+    """Images in the session's patient folder that no journaled capture refers to"""
+    if not state.get("patient_uuid"):
+        return []
+    folder = os.path.join(data_root, state["patient_uuid"])
+    if not os.path.isdir(folder):
+        return []
+    referenced = {info["file"] for info in state["captured_fingers"].values()}
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+            if name.lower().endswith(".bmp") and name not in referenced]
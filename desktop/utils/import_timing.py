@@ -0,0 +1,20 @@
+import time
+import importlib
+
+# First-import cost of each module loaded through timed_import, in milliseconds
+IMPORT_TIMES = {}
+
+
+def timed_import(name):
+    """Import a module by name, recording how long the first import took"""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, (time.perf_counter() - start) * 1000.)
+    return module
+
+
+def format_import_times():
+    lines = ["⏱️ Import times:"]
+    for name, elapsed in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]):
+        lines.append(f"  {name:<24}{elapsed:8.1f} ms")
+    return "\n".join(lines)
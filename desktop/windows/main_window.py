@@ -2,12 +2,17 @@ import sys
 import os
 import uuid
 import json
+import shutil
 import cv2
-from PySide6.QtCore import Qt, QTimer, QThread, Signal, Slot
+from PySide6.QtCore import Qt, QTimer, QThread, QEventLoop, Signal, Slot
 from PySide6.QtGui import QPixmap, QImage, QIntValidator, QRegularExpressionValidator, QDoubleValidator
-from PySide6.QtWidgets import QMainWindow, QMessageBox, QApplication
+from PySide6.QtWidgets import QMainWindow, QMessageBox, QApplication, QLineEdit, QComboBox, QCheckBox, QTextEdit
 from UI.ui import Ui_MainWindow
 from core.fingerprint_controller import FingerprintCaptureController
+from core.pattern_taxonomy import safe_pattern_name, PATTERN_OPTIONS
+from core.pattern_classifier import SessionClassifier, SessionInferenceWorker
+from core.session_journal import SessionJournal, replay, orphaned_images
+from roi import crop_to_roi  # models/main-pattern, put on sys.path by core.pattern_taxonomy
 from PySide6.QtCore import QRegularExpression
 
 
@@ -38,6 +43,14 @@ class MainWindow(QMainWindow):
         self.patient_uuid = None
         self.captured_fingers = {}
 
+        # Session-level pattern inference: captures queue up and are classified in one batch
+        self.session_classifier = SessionClassifier()
+        self.pending_inference = {}
+        self.inflight_inference = {}
+        self.inference_worker = None
+        self.inference_batch_size = 5
+        self.preloader = None
+
         # Finger order for workflow
         self.finger_order = [
             "Right Thumb", "Right Index Finger", "Right Middle Finger", "Right Ring Finger", "Right Little Finger",
@@ -45,9 +58,15 @@ class MainWindow(QMainWindow):
         ]
         self.current_finger_index = 0
 
+        # Crash-recovery journal of the unsaved session (written off the UI thread)
+        self.session_journal = SessionJournal()
+        self._replaying_journal = False
+
         # Connect signals and initialize UI
         self._connect_signals()
         self._initialize_ui()
+        self._connect_journal()
+        QTimer.singleShot(0, self._offer_session_resume)
 
     def _connect_signals(self):
         """Connect all UI signals to their handlers."""
@@ -165,8 +184,10 @@ class MainWindow(QMainWindow):
                 self.is_preview_active = False
                 self.ui.captureButton.setText("🎥 Start Preview")
                 
-                # Get the current captured image
+                # Get the current captured image, cropped to the print so no background is stored
                 self.current_captured_image = self.capture_controller.current_image
+                if self.current_captured_image is not None:
+                    self.current_captured_image = crop_to_roi(self.current_captured_image)
                 
                 if self.current_captured_image is not None:
                     # Simulate AI prediction (you can replace this with actual AI model)
@@ -230,9 +251,10 @@ class MainWindow(QMainWindow):
         if self.patient_uuid is None:
             self.patient_uuid = str(uuid.uuid4())
             os.makedirs(os.path.join("data", self.patient_uuid), exist_ok=True)
+            self._journal("session", patient_uuid=self.patient_uuid)
 
         # Save fingerprint image
-        safe_pattern = self.current_pattern.replace("/", "_").replace("\\", "_")
+        safe_pattern = safe_pattern_name(self.current_pattern)
         side, finger_name = finger.split(" ", 1)
         filename = f"{side}_{finger_name.replace(' ', '_')}_{safe_pattern}.bmp"
         filepath = os.path.join("data", self.patient_uuid, filename)
@@ -240,6 +262,9 @@ class MainWindow(QMainWindow):
 
         # Update captured fingers
         self.captured_fingers[finger] = {"pattern": self.current_pattern, "file": filename}
+        self._journal("capture", finger=finger, pattern=self.current_pattern, file=filename)
+        self.pending_inference[finger] = self.current_captured_image
+        self._maybe_run_session_inference()
         self._update_captured_summary()
         self.ui.progressLabel.setText(f"Progress: {len(self.captured_fingers)}/10 fingers captured")
         self.ui.nextFingerButton.setEnabled(True)
@@ -253,6 +278,7 @@ class MainWindow(QMainWindow):
             finger = self.finger_order[i]
             if finger not in self.captured_fingers:
                 self.current_finger_index = i
+                self._journal("finger_index", index=i)
                 self._update_finger_selection()
                 self._reset_capture_ui()
                 return
@@ -266,6 +292,8 @@ class MainWindow(QMainWindow):
             if os.path.exists(filepath):
                 os.remove(filepath)
             del self.captured_fingers[finger]
+            self._journal("retake", finger=finger)
+            self.pending_inference.pop(finger, None)
             self._update_captured_summary()
             self.ui.progressLabel.setText(f"Progress: {len(self.captured_fingers)}/10 fingers captured")
             self._reset_capture_ui()
@@ -341,13 +369,18 @@ class MainWindow(QMainWindow):
             if self.patient_uuid is None:
                 self.patient_uuid = str(uuid.uuid4())
                 os.makedirs(os.path.join("data", self.patient_uuid), exist_ok=True)
+                self._journal("session", patient_uuid=self.patient_uuid)
+
+            # Classify any fingers still queued (one batched forward pass)
+            self._flush_session_inference()
 
             # Build data with available information
             data = {
                 "uuid": self.patient_uuid,
                 "full_name": self.ui.nameLineEdit.text().strip(),
                 "fingerprints": [
-                    {"finger": finger, "pattern": info["pattern"], "file": info["file"]}
+                    {"finger": finger, "pattern": info["pattern"], "file": info["file"],
+                     "model_prediction": info.get("model_prediction")}
                     for finger, info in self.captured_fingers.items()
                 ],
                 "schema_version": 1,
@@ -395,6 +428,8 @@ class MainWindow(QMainWindow):
             filepath = os.path.join("data", self.patient_uuid, "patient.json")
             with open(filepath, "w") as f:
                 json.dump(data, f, indent=4)
+            # Start the journal over from what is now on disk, so only later changes count as unsaved
+            self.session_journal.reset(self._session_snapshot(), saved=True)
             
             save_type = "Complete" if complete else "Partial"
             QMessageBox.information(self, "Success", f"{save_type} patient data saved successfully!\nFingerprints captured: {len(self.captured_fingers)}")
@@ -413,7 +448,6 @@ class MainWindow(QMainWindow):
             if reply == QMessageBox.Yes:
                 # Delete patient folder if exists
                 if self.patient_uuid and os.path.exists(os.path.join("data", self.patient_uuid)):
-                    import shutil
                     shutil.rmtree(os.path.join("data", self.patient_uuid))
 
                 # Reset form fields
@@ -431,15 +465,204 @@ class MainWindow(QMainWindow):
 
                 # Reset fingerprint data
                 self.captured_fingers.clear()
+                self.pending_inference.clear()
                 self._update_captured_summary()
                 self.ui.progressLabel.setText("Progress: 0/10 fingers captured")
                 self.patient_uuid = None
                 self.current_finger_index = 0
                 self._update_finger_selection()
                 self._reset_capture_ui()
+                self.session_journal.reset()
                 if hasattr(self, 'capture_controller'):
                     self.capture_controller.stop_preview()
 
+    def _journal_widgets(self):
+        """Patient form widgets whose values are journaled, by name."""
+        return {
+            "name": self.ui.nameLineEdit, "age": self.ui.ageLineEdit, "pd": self.ui.pdLineEdit,
+            "cal": self.ui.calLineEdit, "hba1c": self.ui.hba1cLineEdit,
+            "dental_condition": self.ui.dentalDiseaseTypeLineEdit, "medications": self.ui.medicationsTextEdit,
+            "gender": self.ui.genderComboBox, "group": self.ui.groupComboBox, "smoking": self.ui.smokingComboBox,
+            "diabetes": self.ui.diabetesCheckBox, "hypertension": self.ui.hypertensionCheckBox,
+            "heart_disease": self.ui.heartDiseaseCheckBox, "asthma": self.ui.asthmaCheckBox,
+            "periodontal_disease": self.ui.dentalDiseaseCheckBox,
+        }
+
+    def _connect_journal(self):
+        """Journal every patient form change."""
+        for name, widget in self._journal_widgets().items():
+            if isinstance(widget, QLineEdit):
+                widget.textChanged.connect(lambda value, name=name: self._journal("field", name=name, value=value))
+            elif isinstance(widget, QTextEdit):
+                widget.textChanged.connect(lambda name=name, widget=widget: self._journal(
+                    "field", name=name, value=widget.toPlainText()))
+            elif isinstance(widget, QComboBox):
+                widget.currentIndexChanged.connect(lambda value, name=name: self._journal("field", name=name, value=value))
+            elif isinstance(widget, QCheckBox):
+                widget.toggled.connect(lambda value, name=name: self._journal("field", name=name, value=value))
+
+    def _journal(self, event, **fields):
+        if not self._replaying_journal:
+            self.session_journal.record(event, **fields)
+
+    def _form_values(self):
+        values = {}
+        for name, widget in self._journal_widgets().items():
+            if isinstance(widget, QLineEdit):
+                values[name] = widget.text()
+            elif isinstance(widget, QTextEdit):
+                values[name] = widget.toPlainText()
+            elif isinstance(widget, QComboBox):
+                values[name] = widget.currentIndex()
+            elif isinstance(widget, QCheckBox):
+                values[name] = widget.isChecked()
+        return values
+
+    def _offer_session_resume(self):
+        """On startup, offer to resume a session the journal shows was never saved."""
+        state = replay(self.session_journal.path)
+        if state is None:
+            self.session_journal.reset()
+            return
+
+        name = state["fields"].get("name") or "unnamed patient"
+        found = "Unsaved changes to a saved patient were found" if state["previously_saved"] else "An unsaved session was found"
+        reply = QMessageBox.question(
+            self, "Resume Session",
+            f"{found} ({name}, {len(state['captured_fingers'])} fingerprint(s) captured).\n\n"
+            "Do you want to resume it?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+        )
+        if reply == QMessageBox.Yes:
+            self._restore_session(state)
+        else:
+            # Drop the leftover capture folder unless part of it was already saved
+            folder = os.path.join("data", state["patient_uuid"]) if state["patient_uuid"] else None
+            if folder and os.path.isdir(folder) and not os.path.exists(os.path.join(folder, "patient.json")):
+                shutil.rmtree(folder)
+            self.session_journal.reset()
+
+    def _restore_session(self, state):
+        """Rebuild form, captures and progress from a replayed journal."""
+        self._replaying_journal = True
+        try:
+            widgets = self._journal_widgets()
+            for name, value in state["fields"].items():
+                widget = widgets.get(name)
+                if isinstance(widget, QLineEdit):
+                    widget.setText(value)
+                elif isinstance(widget, QTextEdit):
+                    widget.setPlainText(value)
+                elif isinstance(widget, QComboBox):
+                    widget.setCurrentIndex(value)
+                elif isinstance(widget, QCheckBox):
+                    widget.setChecked(value)
+
+            # Images written just before a crash whose capture event never reached the journal:
+            # re-adopt them from their file name, and move anything else aside rather than deleting it
+            for path in orphaned_images("data", state):
+                filename = os.path.basename(path)
+                capture = self._capture_from_filename(filename)
+                if capture is not None and capture[0] not in state["captured_fingers"]:
+                    state["captured_fingers"][capture[0]] = {"pattern": capture[1], "file": filename}
+                else:
+                    aside = os.path.join(os.path.dirname(path), "orphaned")
+                    os.makedirs(aside, exist_ok=True)
+                    shutil.move(path, os.path.join(aside, filename))
+
+            self.patient_uuid = state["patient_uuid"]
+            self.captured_fingers.clear()
+            self.pending_inference.clear()
+            for finger, info in state["captured_fingers"].items():
+                filepath = os.path.join("data", self.patient_uuid, info["file"])
+                if os.path.exists(filepath):
+                    self.captured_fingers[finger] = dict(info)
+                    self.pending_inference[finger] = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+
+            self.current_finger_index = state["current_finger_index"]
+            self._update_finger_selection()
+            self._update_captured_summary()
+            self.ui.progressLabel.setText(f"Progress: {len(self.captured_fingers)}/10 fingers captured")
+            self.ui.nextFingerButton.setEnabled(bool(self.captured_fingers))
+            self._update_button_states()
+        finally:
+            self._replaying_journal = False
+
+        # Compact the journal to a snapshot of what was restored
+        self.session_journal.reset(self._session_snapshot())
+        self._maybe_run_session_inference()
+
+    def _session_snapshot(self):
+        """Journal snapshot of the current session."""
+        return {
+            "patient_uuid": self.patient_uuid,
+            "captured_fingers": {finger: {"pattern": info["pattern"], "file": info["file"]}
+                                 for finger, info in self.captured_fingers.items()},
+            "fields": self._form_values(),
+            "current_finger_index": self.current_finger_index,
+        }
+
+    def _capture_from_filename(self, filename):
+        """(finger, pattern) encoded in a capture file name by _save_current_finger, or None."""
+        for finger in self.finger_order:
+            side, finger_name = finger.split(" ", 1)
+            prefix = f"{side}_{finger_name.replace(' ', '_')}_"
+            if filename.startswith(prefix) and filename.endswith(".bmp"):
+                safe_pattern = filename[len(prefix):-len(".bmp")]
+                for pattern in PATTERN_OPTIONS:
+                    if safe_pattern_name(pattern) == safe_pattern:
+                        return finger, pattern
+        return None
+
+    def _maybe_run_session_inference(self):
+        """Classify queued fingers in the background once enough of them are pending."""
+        if self.inference_worker is not None and self.inference_worker.isRunning():
+            return
+        if len(self.pending_inference) < self.inference_batch_size:
+            return
+        self.inflight_inference = dict(self.pending_inference)
+        self.inference_worker = SessionInferenceWorker(self.session_classifier, self.inflight_inference, self)
+        self.inference_worker.results_ready.connect(self._apply_session_predictions)
+        self.inference_worker.start()
+
+    def _flush_session_inference(self):
+        """Finish background inference and classify every remaining pending finger, off the UI thread.
+
+        The form is disabled meanwhile: the local event loop still delivers
+        clicks, and Clear All or Retake would change the session being saved.
+        """
+        self.centralWidget().setEnabled(False)
+        try:
+            if self.inference_worker is not None:
+                self._wait_for_worker(self.inference_worker)
+                self._apply_session_predictions(self.inference_worker.results)
+            if self.pending_inference:
+                self.inflight_inference = dict(self.pending_inference)
+                self.inference_worker = SessionInferenceWorker(self.session_classifier, self.inflight_inference, self)
+                self.inference_worker.start()
+                self._wait_for_worker(self.inference_worker)
+                self._apply_session_predictions(self.inference_worker.results)
+        finally:
+            self.centralWidget().setEnabled(True)
+            self._update_button_states()
+
+    def _wait_for_worker(self, worker):
+        """Run a local event loop until the worker finishes, so the window keeps repainting."""
+        if not worker.isRunning():
+            return
+        loop = QEventLoop()
+        worker.finished.connect(loop.quit)
+        if worker.isRunning():
+            loop.exec()
+
+    def _apply_session_predictions(self, results):
+        """Store batch predictions for captures that were not retaken in the meantime."""
+        for finger, prediction in results.items():
+            frame = self.inflight_inference.get(finger)
+            if frame is not None and self.pending_inference.get(finger) is frame:
+                self.captured_fingers[finger]["model_prediction"] = prediction
+                del self.pending_inference[finger]
+
     def _get_ai_prediction(self, image):
         """Placeholder for AI prediction - replace with actual AI model"""
         # This is where you would integrate your actual fingerprint pattern recognition AI model
@@ -477,6 +700,13 @@ class MainWindow(QMainWindow):
             # Stop any ongoing operations
             if hasattr(self, 'capture_controller'):
                 self.capture_controller.cleanup()
+            if self.inference_worker is not None:
+                self.inference_worker.wait()
+            # A QThread destroyed while running aborts the app; the preloader stops between imports
+            if self.preloader is not None:
+                self.preloader.requestInterruption()
+                self.preloader.wait()
+            self.session_journal.close()
             event.accept()
         except Exception as e:
             print(f"Error during cleanup: {e}")
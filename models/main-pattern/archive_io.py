@@ -0,0 +1,147 @@
+import io
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+import cv2
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif')
+
+
+def is_image_member(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not Path(name).name.startswith('.')
+
+
+def iter_archive_images(archive_path):
+    """Yield (member name, raw bytes) for every image in a ZIP or TAR archive, one member at a time.
+
+    TAR archives (plain or compressed) are read as a forward-only stream, so
+    only the current member is ever held in memory.
+    """
+    archive_path = str(archive_path)
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_image_member(info.filename):
+                    yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(archive_path, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and is_image_member(member.name):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def decode_grayscale(data):
+    """Decode encoded image bytes to a grayscale array in memory (None if undecodable)"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+class ShardWriter:
+    """Writes encoded images into numbered, uncompressed TAR shards of bounded size.
+
+    A new ``shard-XXXXX.tar`` is started once the current one reaches
+    ``max_shard_bytes``, so outputs can be copied, deleted or consumed shard by
+    shard. Uncompressed TAR keeps members seekable for ArchiveImageDataset.
+    """
+    def __init__(self, output_root, max_shard_bytes=512 * 1024 * 1024):
+        self.output_root = Path(output_root)
+        self.output_root.mkdir(parents=True, exist_ok=True)
+        self.max_shard_bytes = max_shard_bytes
+        self.shard_index = -1
+        self.shard_bytes = 0
+        self.archive = None
+        self.count = 0
+
+    def write(self, name, data):
+        if self.archive is None or self.shard_bytes >= self.max_shard_bytes:
+            self._next_shard()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, io.BytesIO(data))
+        self.shard_bytes += len(data)
+        self.count += 1
+
+    def _next_shard(self):
+        self.close()
+        self.shard_index += 1
+        self.shard_bytes = 0
+        self.archive = tarfile.open(self.output_root / f"shard-{self.shard_index:05d}.tar", mode='w')
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveImageDataset(Dataset):
+    """ImageFolder-style dataset read straight from ZIP or uncompressed TAR archives.
+
+    Members under ``prefix`` laid out as ``<prefix><class>/<file>`` become
+    samples, e.g. ``prefix="train_set/"`` for the shards written by
+    ``DatasetPreprocessor.process_archive``. Archives are opened lazily per
+    process, so the dataset works with DataLoader workers.
+    """
+    def __init__(self, archive_paths, prefix="", transform=None):
+        self.archive_paths = [str(path) for path in archive_paths]
+        self.prefix = prefix
+        self.transform = transform
+        self._handles = {}
+
+        self.samples = []
+        for archive_index, path in enumerate(self.archive_paths):
+            for name, location in self._index(path):
+                relative = name[len(prefix):].split("/") if name.startswith(prefix) else []
+                if len(relative) >= 2 and is_image_member(name):
+                    self.samples.append((archive_index, location, relative[0]))
+
+        self.classes = sorted({label for _, _, label in self.samples})
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.targets = [self.class_to_idx[label] for _, _, label in self.samples]
+
+    @staticmethod
+    def _index(path):
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return [(info.filename, info.filename) for info in archive.infolist() if not info.is_dir()]
+        with tarfile.open(path, mode='r:') as archive:
+            return [(member.name, (member.offset_data, member.size)) for member in archive.getmembers() if member.isfile()]
+
+    def _read(self, archive_index, location):
+        handle = self._handles.get(archive_index)
+        path = self.archive_paths[archive_index]
+        if handle is None:
+            handle = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else open(path, 'rb')
+            self._handles[archive_index] = handle
+        if isinstance(handle, zipfile.ZipFile):
+            return handle.read(location)
+        offset, size = location
+        handle.seek(offset)
+        return handle.read(size)
+
+    def __getstate__(self):
+        # Open archive handles can't be pickled into DataLoader workers
+        state = self.__dict__.copy()
+        state['_handles'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        archive_index, location, _ = self.samples[idx]
+        image = Image.open(io.BytesIO(self._read(archive_index, location))).convert("RGB")
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[idx]
@@ -1,63 +1,315 @@
 import cv2
 import numpy as np
 import os
+import json
+import shutil
+import tarfile
+import time
+import zipfile
+from functools import lru_cache
 from pathlib import Path
+from archive_io import iter_archive_images, decode_grayscale, ShardWriter
+from orientation_field import orientation_field
+from roi import crop_to_roi
+
+GABOR_ORIENTATIONS = 16
+GABOR_PERIODS = (4, 6, 8, 10, 12, 14, 16)  # ridge periods in pixels
+GABOR_SIGMA = 4.0
+GABOR_BLOCK = 16
+
+
+@lru_cache(maxsize=8)
+def gabor_bank(patch_size, orientations=GABOR_ORIENTATIONS, periods=GABOR_PERIODS, sigma=GABOR_SIGMA):
+    """Even-symmetric Gabor kernels for every (orientation, period) bin, as rfft2 spectra of patch_size patches.
+
+    Kernels are centred on the origin (wrapped), so multiplying a block patch's
+    spectrum by one and inverting is a convolution. Built once per process.
+    """
+    radius = int(3 * sigma)
+    y, x = np.mgrid[-radius:radius + 1, -radius:radius + 1].astype(np.float32)
+    bank = np.zeros((orientations, len(periods), patch_size, patch_size // 2 + 1), dtype=np.complex64)
+    for o in range(orientations):
+        # Ridge direction θ → the wave runs along the ridge normal
+        normal = o * np.pi / orientations + np.pi / 2
+        u = x * np.cos(normal) + y * np.sin(normal)
+        envelope = np.exp(-(x ** 2 + y ** 2) / (2 * sigma ** 2))
+        for f, period in enumerate(periods):
+            kernel = envelope * np.cos(2 * np.pi * u / period)
+            kernel -= kernel.mean()
+            padded = np.zeros((patch_size, patch_size), dtype=np.float32)
+            padded[:kernel.shape[0], :kernel.shape[1]] = kernel
+            padded = np.roll(padded, (-radius, -radius), axis=(0, 1))
+            bank[o, f] = np.fft.rfft2(padded)
+    return bank
+
+
+def ridge_period_field(img, block_size=GABOR_BLOCK, periods=GABOR_PERIODS):
+    """Dominant ridge period per block from the spectral peak of a 2×block windowed patch (all blocks in one FFT)"""
+    window = 2 * block_size
+    rows, cols = img.shape[0] // block_size, img.shape[1] // block_size
+    padded = np.pad(img, block_size // 2, mode='reflect')
+    patches = np.lib.stride_tricks.sliding_window_view(padded, (window, window))[::block_size, ::block_size]
+    patches = patches[:rows, :cols].reshape(-1, window, window)
+    patches = (patches - patches.mean(axis=(1, 2), keepdims=True)) * np.outer(np.hanning(window), np.hanning(window))
+
+    spectrum = np.abs(np.fft.rfft2(patches))
+    fy = np.fft.fftfreq(window)[:, None]
+    fx = np.fft.rfftfreq(window)[None, :]
+    radius = np.sqrt(fx ** 2 + fy ** 2)
+    band = (radius >= 1 / max(periods)) & (radius <= 1 / min(periods))
+    spectrum[:, ~band] = 0
+
+    peak = spectrum.reshape(len(patches), -1).argmax(axis=1)
+    frequency = radius.flatten()[peak].reshape(rows, cols).astype(np.float32)
+    return cv2.medianBlur(1 / np.maximum(frequency, 1e-3), 3)
+
+
+def gabor_enhance(img, block_size=GABOR_BLOCK, orientations=GABOR_ORIENTATIONS, periods=GABOR_PERIODS,
+                  sigma=GABOR_SIGMA):
+    """Orientation- and frequency-adaptive Gabor enhancement of a grayscale print (same polarity, uint8).
+
+    Every block is filtered with the bank kernel closest to its local ridge
+    orientation and period. Filtering is one batched FFT over all block patches
+    rather than a convolution per filter; background blocks come out flat mid-gray.
+    """
+    height, width = img.shape
+    pad_h, pad_w = -height % block_size, -width % block_size
+    padded_img = np.pad(img, ((0, pad_h), (0, pad_w)), mode='reflect')
+    rows, cols = padded_img.shape[0] // block_size, padded_img.shape[1] // block_size
+
+    orientation, _, mask = orientation_field(padded_img, block_size=block_size)
+    period = ridge_period_field(padded_img, block_size=block_size, periods=periods)
+    orientation_bin = np.round(orientation / (np.pi / orientations)).astype(int) % orientations
+    period_bin = np.abs(period[..., None] - np.asarray(periods, dtype=np.float32)).argmin(axis=-1)
+
+    normalized = padded_img.astype(np.float32)
+    foreground = np.repeat(np.repeat(mask, block_size, axis=0), block_size, axis=1)
+    if foreground.any():
+        normalized = (normalized - normalized[foreground].mean()) / (normalized[foreground].std() + 1e-6)
+
+    radius = int(3 * sigma)
+    patch_size = block_size + 2 * radius
+    source = np.pad(normalized, radius, mode='reflect')
+    patches = np.lib.stride_tricks.sliding_window_view(source, (patch_size, patch_size))[::block_size, ::block_size]
+    patches = patches[:rows, :cols].reshape(-1, patch_size, patch_size)
+
+    bank = gabor_bank(patch_size, orientations, tuple(periods), sigma)
+    filtered = np.fft.irfft2(np.fft.rfft2(patches) * bank[orientation_bin.ravel(), period_bin.ravel()],
+                             s=(patch_size, patch_size))
+    blocks = filtered[:, radius:radius + block_size, radius:radius + block_size]
+    response = blocks.reshape(rows, cols, block_size, block_size).transpose(0, 2, 1, 3).reshape(rows * block_size, -1)
+
+    scale = np.percentile(np.abs(response[foreground]), 99) if foreground.any() else 1.0
+    enhanced = np.clip(128 + 127 * response / (scale + 1e-6), 0, 255)
+    enhanced[~foreground] = 128
+    return enhanced[:height, :width].astype(np.uint8)
+
+
+def binarize_ridge_map(img, clip_limit=2.0, tile_grid=8, block_size=11, c=2, enhance=False):
+    """Enhance contrast, smooth, binarize, and invert a grayscale array to white ridges on black.
+
+    With ``enhance``, the print first goes through gabor_enhance, which repairs
+    the broken (dry) and merged (wet) ridges a fixed threshold struggles with.
+    """
+    if enhance:
+        img = gabor_enhance(img)
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
+    enhanced = clahe.apply(img)
+
+    blurred = cv2.GaussianBlur(enhanced, (3, 3), 0)
+
+    binary = cv2.adaptiveThreshold(
+        blurred, 255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV,
+        blockSize=block_size,
+        C=c
+    )
+
+    kernel = np.ones((2, 2), np.uint8)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=1)
+
+    smoothed = cv2.GaussianBlur(closed, (3, 3), 0)
+    _, final = cv2.threshold(smoothed, 128, 255, cv2.THRESH_BINARY)
+
+    return final
+
+
+class ErrorLedger:
+    """JSON-lines record of files that failed preprocessing: one {"path", "reason", "time"} per line.
+
+    Archive members also carry {"kind": "archive", "archive", "member"}.
+
+    Entries are appended and flushed as they happen, so the ledger survives a
+    crash or Ctrl+C mid-run.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.count = 0
+
+    def record(self, path, reason, **extra):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"path": str(path), "reason": reason, "time": time.time(), **extra}) + "\n")
+        self.count += 1
+        print(f"⚠️ {path}: {reason}")
+
+    def entries(self):
+        if not self.path.exists():
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+        self.count = 0
+
 
 class DatasetPreprocessor:
-    def __init__(self, input_root, output_root="preprocessed_data"):
+    def __init__(self, input_root, output_root="preprocessed_data", quarantine_root=None, enhance=False,
+                 crop_roi=True):
         self.input_root = Path(input_root)
+        self.enhance = enhance
+        self.crop_roi = crop_roi
         self.output_root = Path(output_root)
         self.output_root.mkdir(parents=True, exist_ok=True)
+        self.quarantine_root = Path(quarantine_root) if quarantine_root else None
+        self.ledger = ErrorLedger(self.output_root / "preprocess_errors.jsonl")
 
     def preprocess_image(self, image_path):
         """Enhance contrast, smooth, binarize, and invert to white ridges on black."""
+        if os.path.getsize(image_path) == 0:
+            raise ValueError("empty file")
         img = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError("unreadable or unsupported image")
+        return self.preprocess_array(img)
 
-  
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(img)
+    def preprocess_array(self, img):
+        """Crop to the print (unless disabled) and binarize a decoded grayscale array."""
+        if self.crop_roi:
+            img = crop_to_roi(img)
+        return binarize_ridge_map(img, enhance=self.enhance)
 
-      
-        blurred = cv2.GaussianBlur(enhanced, (3, 3), 0)
+    def process_dataset(self):
+        """Walks through the dataset and processes every image, logging failures instead of stopping."""
+        self.ledger.clear()
+        processed = 0
+        for root, _, files in os.walk(self.input_root):
+            for file in files:
+                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif')):
+                    processed += self._process_file(Path(root) / file)
 
-       
-        binary = cv2.adaptiveThreshold(
-            blurred, 255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV,
-            blockSize=11,
-            C=2
-        )
+        print(f"✅ Preprocessing complete. {processed} images saved to: {self.output_root.resolve()}")
+        self._report_failures()
 
-        
-        kernel = np.ones((2, 2), np.uint8)
-        closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=1)
+    def retry_failures(self):
+        """Reprocesses only the files in the error ledger; whatever still fails is logged again."""
+        entries = self.ledger.entries()
+        if not entries:
+            print("✅ No failures to retry.")
+            return
+        self.ledger.clear()
 
-        
-        smoothed = cv2.GaussianBlur(closed, (3, 3), 0)
-        _, final = cv2.threshold(smoothed, 128, 255, cv2.THRESH_BINARY)
+        processed = 0
+        archives = set()
+        for entry in entries:
+            if entry.get("kind") == "archive":
+                # Archive members are retried by rerunning process_archive; keep them queued
+                archives.add(entry["archive"])
+                self.ledger.record(**{key: value for key, value in entry.items() if key != "time"})
+                continue
+            path = Path(entry["path"])
+            if self.quarantine_root is not None and not path.exists() and path.is_relative_to(self.input_root):
+                quarantined = self.quarantine_root / path.relative_to(self.input_root)
+                if quarantined.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path = Path(shutil.move(str(quarantined), path))
+            if not path.exists():
+                self.ledger.record(entry["path"], entry["reason"])
+                continue
+            processed += self._process_file(path)
 
-        return final
+        print(f"✅ Retried {len(entries)} failures: {processed} now preprocessed.")
+        for archive in sorted(archives):
+            print(f"⚠️ Members of {archive} failed; rerun process_archive on it once fixed.")
+        self._report_failures()
 
-    def process_dataset(self):
-        """Walks through the dataset and processes every image."""
-        for root, _, files in os.walk(self.input_root):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif')):
-                    input_file_path = Path(root) / file
-                    relative_path = input_file_path.relative_to(self.input_root)
-                    output_file_path = self.output_root / relative_path
+    def _process_file(self, input_file_path):
+        relative_path = input_file_path.relative_to(self.input_root)
+        output_file_path = self.output_root / relative_path
+        try:
+            processed_image = self.preprocess_image(input_file_path)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            # Only a bad source file is quarantined
+            self.ledger.record(input_file_path, f"{type(e).__name__}: {e}")
+            self._quarantine(input_file_path, relative_path)
+            return 0
+
+        try:
+            output_file_path.parent.mkdir(parents=True, exist_ok=True)
+            if not cv2.imwrite(str(output_file_path), processed_image):
+                raise OSError(f"could not write {output_file_path}")
+            return 1
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            # Disk full, bad output path...: the source is fine, so leave it in place for retry_failures()
+            self.ledger.record(input_file_path, f"{type(e).__name__}: {e}")
+            return 0
+
+    def _quarantine(self, input_file_path, relative_path):
+        if self.quarantine_root is None or not input_file_path.exists():
+            return
+        destination = self.quarantine_root / relative_path
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(input_file_path), destination)
+
+    def _report_failures(self):
+        if self.ledger.count:
+            print(f"❌ {self.ledger.count} files failed; see {self.ledger.path} and run retry_failures() once fixed.")
 
-                    
-                    output_file_path.parent.mkdir(parents=True, exist_ok=True)
+    def process_archive(self, archive_path, max_shard_bytes=512 * 1024 * 1024):
+        """Preprocesses every image of a ZIP/TAR archive without extracting it.
 
-                    processed_image = self.preprocess_image(input_file_path)
-                    cv2.imwrite(str(output_file_path), processed_image)
+        Members are decoded in memory and the results written, under the same
+        relative paths, into TAR shards in output_root (readable by
+        archive_io.ArchiveImageDataset), so disk and memory use stay bounded.
+        Members that fail are logged to the error ledger as <archive>/<member>.
+        """
+        self.ledger.clear()
+        with ShardWriter(self.output_root, max_shard_bytes=max_shard_bytes) as writer:
+            for name, data in iter_archive_images(archive_path):
+                try:
+                    img = decode_grayscale(data)
+                    if img is None:
+                        raise ValueError("unreadable or unsupported image")
+                    ok, encoded = cv2.imencode(Path(name).suffix, self.preprocess_array(img))
+                    if not ok:
+                        raise ValueError("could not encode output")
+                except KeyboardInterrupt:
+                    raise
+                except Exception as e:
+                    self.ledger.record(f"{archive_path}/{name}", f"{type(e).__name__}: {e}",
+                                       kind="archive", archive=str(archive_path), member=name)
+                    continue
+                writer.write(name, encoded.tobytes())
 
-        print(f"✅ Preprocessing complete. All data saved to: {self.output_root.resolve()}")
+        print(f"✅ Preprocessed {writer.count} images from {archive_path} into {writer.shard_index + 1} shards"
+              f" at: {self.output_root.resolve()}")
+        self._report_failures()
 
 
 if __name__ == "__main__":
     input_dir = r"path"
-    processor = DatasetPreprocessor(input_dir)
-    processor.process_dataset()
+    RETRY_FAILURES = False
+    ENHANCE = False  # Gabor enhancement for dry/wet prints
+    processor = DatasetPreprocessor(input_dir, quarantine_root="quarantine", enhance=ENHANCE)
+    if RETRY_FAILURES:
+        processor.retry_failures()
+    elif zipfile.is_zipfile(input_dir) or tarfile.is_tarfile(input_dir):
+        processor.process_archive(input_dir)
+    else:
+        processor.process_dataset()
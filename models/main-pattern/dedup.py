@@ -0,0 +1,200 @@
+import cv2
+import json
+import os
+import random
+import shutil
+import numpy as np
+from collections import defaultdict
+from pathlib import Path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif')
+HASH_BITS = 64
+
+# Number of set bits of every byte value, for vectorized Hamming distances
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(img, hash_size=8):
+    """64-bit DCT perceptual hash of a grayscale array (robust to rescaling, blur and small shifts in contrast)"""
+    small = cv2.resize(img, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(query, hashes):
+    """Hamming distance between one hash and a uint64 array of hashes"""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(query))
+    return POPCOUNT_TABLE[xor.view(np.uint8)].reshape(len(xor), 8).sum(axis=1)
+
+
+class MultiIndexHashTable:
+    """Near-duplicate lookup on 64-bit hashes without comparing every pair.
+
+    Hashes are split into ``max_distance + 1`` disjoint chunks, each with its
+    own exact-match table. By the pigeonhole principle two hashes within
+    ``max_distance`` bits agree exactly on at least one chunk, so only hashes
+    sharing a chunk are ever compared bit by bit.
+    """
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        edges = np.linspace(0, HASH_BITS, chunks + 1).astype(int)
+        self.chunks = [(int(start), int(stop)) for start, stop in zip(edges[:-1], edges[1:])]
+        self.tables = [defaultdict(list) for _ in self.chunks]
+        self.hashes = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _keys(self, value):
+        return [(value >> start) & ((1 << (stop - start)) - 1) for start, stop in self.chunks]
+
+    def add(self, value):
+        """Insert a hash and return its position"""
+        position = len(self.hashes)
+        self.hashes.append(value)
+        for table, key in zip(self.tables, self._keys(value)):
+            table[key].append(position)
+        return position
+
+    def query(self, value):
+        """Positions of every stored hash within max_distance bits of value"""
+        candidates = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            candidates.update(table.get(key, ()))
+        if not candidates:
+            return []
+        candidates = sorted(candidates)
+        distances = hamming_distances(value, [self.hashes[i] for i in candidates])
+        return [i for i, distance in zip(candidates, distances) if distance <= self.max_distance]
+
+
+class DuplicateDetector:
+    """Finds exact and near-duplicate captures in an <input_root>/<class>/... image tree.
+
+    Images are grouped into clusters of transitively similar perceptual hashes.
+    ``split`` then assigns whole clusters to train/val/test so retakes of the
+    same print never leak across splits.
+    """
+    def __init__(self, input_root, max_distance=6):
+        self.input_root = Path(input_root)
+        self.max_distance = max_distance
+        self.paths = []
+        self.hashes = []
+        self.clusters = []
+
+    def scan(self):
+        """Hash every image under input_root and cluster near-duplicates"""
+        table = MultiIndexHashTable(self.max_distance)
+        parent = []
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for root, _, files in os.walk(self.input_root):
+            for file in sorted(files):
+                if not file.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                image_path = Path(root) / file
+                img = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    print(f"⚠️ Skipping unreadable image: {image_path}")
+                    continue
+
+                value = perceptual_hash(img)
+                matches = table.query(value)
+                position = table.add(value)
+                parent.append(position)
+                for match in matches:
+                    parent[find(match)] = find(position)
+
+                self.paths.append(image_path)
+                self.hashes.append(value)
+
+        groups = defaultdict(list)
+        for i in range(len(self.paths)):
+            groups[find(i)].append(i)
+        self.clusters = sorted(groups.values(), key=lambda members: members[0])
+
+        duplicates = sum(len(members) - 1 for members in self.clusters)
+        print(f"✅ Hashed {len(self.paths)} images: {len(self.clusters)} unique, {duplicates} duplicates")
+        return self.clusters
+
+    def label(self, index):
+        """Class of an image: its first directory under input_root"""
+        return self.paths[index].relative_to(self.input_root).parts[0]
+
+    def cluster_label(self, members):
+        """Majority class of a cluster"""
+        labels = [self.label(i) for i in members]
+        return max(set(labels), key=labels.count)
+
+    def report(self, output_path="duplicates.json"):
+        """Write every cluster with more than one image, flagging clusters that span classes"""
+        clusters = []
+        for members in self.clusters:
+            if len(members) < 2:
+                continue
+            labels = sorted({self.label(i) for i in members})
+            clusters.append({
+                "images": [str(self.paths[i].relative_to(self.input_root)) for i in members],
+                "labels": labels,
+                "conflicting_labels": len(labels) > 1
+            })
+
+        with open(output_path, "w") as f:
+            json.dump({"max_distance": self.max_distance, "images": len(self.paths),
+                       "unique": len(self.clusters), "clusters": clusters}, f, indent=4)
+
+        conflicts = sum(cluster["conflicting_labels"] for cluster in clusters)
+        print(f"📝 {len(clusters)} duplicate clusters ({conflicts} with conflicting labels) → {output_path}")
+        return clusters
+
+    def split(self, output_root="preprocessed_data", ratios=(0.7, 0.15, 0.15), deduplicate=True, seed=42):
+        """Copy images into <output_root>/{train,val,test}_set/<class>/, keeping each cluster in one split.
+
+        Clusters are assigned per class to whichever split is furthest below its
+        target share, so class balance holds even with large clusters. With
+        ``deduplicate`` only the first image of each cluster is kept.
+        """
+        split_names = ("train_set", "val_set", "test_set")
+        output_root = Path(output_root)
+
+        by_label = defaultdict(list)
+        for members in self.clusters:
+            by_label[self.cluster_label(members)].append(members)
+
+        rng = random.Random(seed)
+        counts = {name: 0 for name in split_names}
+        for label, clusters in sorted(by_label.items()):
+            rng.shuffle(clusters)
+            assigned = [0] * len(split_names)
+            total = sum(1 if deduplicate else len(members) for members in clusters)
+            for members in clusters:
+                kept = members[:1] if deduplicate else members
+                deficits = [ratio * total - count for ratio, count in zip(ratios, assigned)]
+                target = int(np.argmax(deficits))
+                assigned[target] += len(kept)
+
+                for i in kept:
+                    # Keep the path under input_root (<class>/...): capture file names repeat across patients
+                    destination = output_root / split_names[target] / self.paths[i].relative_to(self.input_root)
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(self.paths[i], destination)
+                counts[split_names[target]] += len(kept)
+
+        print(f"✅ Group-aware split saved to {output_root.resolve()}: " +
+              ", ".join(f"{name} {count}" for name, count in counts.items()))
+        return counts
+
+
+if __name__ == "__main__":
+    input_dir = r"path"
+    detector = DuplicateDetector(input_dir, max_distance=6)
+    detector.scan()
+    detector.report("duplicates.json")
+    detector.split("preprocessed_data", deduplicate=True)
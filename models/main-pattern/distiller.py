@@ -0,0 +1,128 @@
+import copy
+import torch
+import torch.nn.functional as F
+from torchvision import transforms, datasets
+from torch.utils.data import DataLoader
+from trainer import Trainer
+from student_model import FingerprintStudentCNN, GrayscaleTeacher
+from swin_benchmark import measure_latency
+from inference import load_model
+from pattern_taxonomy import COARSE_CLASSES
+
+class DistillationTrainer(Trainer):
+    """Trains a small single-channel student against a frozen FingerprintSwinWithAttention teacher.
+
+    The loss is ``alpha * T² * KL(student/T || teacher/T) + (1 - alpha) * CE``.
+    Loaders must yield 1-channel images normalized with mean 0.5 / std 0.5;
+    the teacher sees them as the ImageNet-normalized RGB it was trained on.
+    """
+    def __init__(self, student, teacher, train_loader, val_loader, test_loader=None, device='cpu', lr=1e-3,
+                 temperature=4.0, alpha=0.7, **kwargs):
+        super().__init__(student, train_loader, val_loader, test_loader, device=device, lr=lr, **kwargs)
+
+        self.teacher = GrayscaleTeacher(teacher).to(device).eval()
+        for param in self.teacher.parameters():
+            param.requires_grad = False
+        self.temperature = temperature
+        self.alpha = alpha
+
+        self.best_model_path = self.weights_folder / f"best_student_{self.run_id}.pth"
+        self.final_model_path = self.weights_folder / f"final_student_{self.run_id}.pth"
+        self.metrics["distillation"] = None
+
+    def compute_loss(self, images, outputs, labels):
+        with torch.no_grad():
+            teacher_logits = self.teacher(images)
+
+        T = self.temperature
+        soft_loss = F.kl_div(
+            F.log_softmax(outputs / T, dim=1),
+            F.softmax(teacher_logits / T, dim=1),
+            reduction='batchmean'
+        ) * (T * T)
+        hard_loss = self.criterion(outputs, labels)
+        return self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+
+    def compare(self):
+        """Report the student/teacher accuracy gap and CPU latency and memory reduction on the test split"""
+        if self.test_loader is None:
+            self._log("⚠️ No test loader provided.")
+            return None
+
+        student_acc = self.metrics["test_acc"]
+        if student_acc is None:
+            student_acc = self.test()
+        _, teacher_confusion = self.evaluate(self.test_loader, desc="Testing teacher", leave=True, model=self.teacher)
+        teacher_acc = teacher_confusion.accuracy
+
+        if not self.is_main:
+            return None
+
+        student = copy.deepcopy(self._unwrapped_model()).cpu().eval()
+        teacher = copy.deepcopy(self.teacher).cpu().eval()
+        report = {
+            "teacher_test_acc": teacher_acc,
+            "student_test_acc": student_acc,
+            "accuracy_gap": teacher_acc - student_acc,
+            "teacher_params": _count_parameters(teacher),
+            "student_params": _count_parameters(student),
+            "teacher_memory_mb": _model_memory_mb(teacher),
+            "student_memory_mb": _model_memory_mb(student),
+            "teacher_cpu_latency_ms": measure_latency(teacher, 1, channels=1),
+            "student_cpu_latency_ms": measure_latency(student, 1, channels=1)
+        }
+        report["memory_reduction"] = report["teacher_memory_mb"] / report["student_memory_mb"]
+        report["speedup"] = report["teacher_cpu_latency_ms"] / report["student_cpu_latency_ms"]
+        self.metrics["distillation"] = report
+        self._save_metrics()
+
+        self._log(f"\n🎓 Distillation Results:")
+        self._log(f"Teacher Acc: {teacher_acc:.2f}% | Student Acc: {student_acc:.2f}% | Gap: {report['accuracy_gap']:.2f} pts")
+        self._log(f"Params: {report['teacher_params']:,} → {report['student_params']:,} "
+                  f"({report['teacher_memory_mb']:.1f} MB → {report['student_memory_mb']:.1f} MB, "
+                  f"{report['memory_reduction']:.1f}× smaller)")
+        self._log(f"CPU latency (batch 1): {report['teacher_cpu_latency_ms']:.1f} ms → "
+                  f"{report['student_cpu_latency_ms']:.1f} ms ({report['speedup']:.1f}× faster)")
+        return report
+
+
+def _count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def _model_memory_mb(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / 2 ** 20
+
+
+if __name__ == '__main__':
+
+    TEACHER_PATH = r"path"
+    CLASS_NAMES = COARSE_CLASSES
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print(f"Using device: {device}")
+
+    transform = transforms.Compose([
+        transforms.Grayscale(num_output_channels=1),
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5], std=[0.5])
+    ])
+
+    train_set = datasets.ImageFolder("preprocessed_data/train_set", transform=transform)
+    val_set = datasets.ImageFolder("preprocessed_data/val_set", transform=transform)
+    test_set = datasets.ImageFolder("preprocessed_data/test_set", transform=transform)
+
+    train_loader = DataLoader(train_set, batch_size=32, shuffle=True, num_workers=0)
+    val_loader = DataLoader(val_set, batch_size=32, shuffle=False, num_workers=0)
+    test_loader = DataLoader(test_set, batch_size=32, shuffle=False, num_workers=0)
+
+    teacher = load_model(TEACHER_PATH, num_classes=len(CLASS_NAMES), device=device)
+    if teacher is not None:
+        student = FingerprintStudentCNN(num_classes=len(CLASS_NAMES))
+        trainer = DistillationTrainer(student, teacher, train_loader, val_loader, test_loader, device=device, lr=1e-3)
+
+        trainer.fit(epochs=20)
+        trainer.test()
+        trainer.compare()
@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+import numpy as np
+import torch
+from PIL import Image, UnidentifiedImageError
+
+from inference import IMAGE_TRANSFORM
+
+KEY_BYTES = 32  # sha256 digest
+
+
+def image_hash(image_path):
+    """sha256 digest of the image file contents (identical files share one embedding)"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def model_fingerprint(model):
+    """sha256 (hex) of the model weights, so stored features can be tied to the checkpoint that made them.
+
+    Computed once per model object and cached as ``model.checkpoint_id``.
+    """
+    if getattr(model, 'checkpoint_id', None) is None:
+        digest = hashlib.sha256()
+        for name, tensor in sorted(model.state_dict().items()):
+            digest.update(name.encode())
+            digest.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+        model.checkpoint_id = digest.hexdigest()
+    return model.checkpoint_id
+
+
+class EmbeddingStore:
+    """Append-only, memory-mapped store of backbone features keyed by image hash.
+
+    ``embeddings.f32`` holds one float32 row per image and ``keys.bin`` the
+    matching 32-byte digests in the same order. Reads go through np.memmap,
+    so the whole store can be handed to clustering or nearest-neighbour code
+    without loading it into RAM. ``meta.json`` records the checkpoint the
+    features came from (see ``bind``).
+    """
+    def __init__(self, root, dim=768):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = self.root / "embeddings.f32"
+        self.keys_path = self.root / "keys.bin"
+        self.meta_path = self.root / "meta.json"
+
+        keys = self._read_keys()
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._matrix = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def model_id(self):
+        if not self.meta_path.exists():
+            return None
+        return json.loads(self.meta_path.read_text()).get("model_id")
+
+    def bind(self, model_id):
+        """Ties the store to one checkpoint; features from any other (or an unknown) checkpoint are dropped"""
+        if self.model_id != model_id:
+            if self._rows:
+                print(f"⚠️ Embedding store {self.root} was built with another checkpoint; discarding {len(self._rows)} embeddings")
+            self.vectors_path.unlink(missing_ok=True)
+            self.keys_path.unlink(missing_ok=True)
+            self._rows = {}
+            self._matrix = None
+            self.meta_path.write_text(json.dumps({"model_id": model_id, "dim": self.dim}))
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    @property
+    def matrix(self):
+        """All stored embeddings as a read-only (N, dim) memmap"""
+        if not self._rows:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._matrix is None or len(self._matrix) != len(self._rows):
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(len(self._rows), self.dim))
+        return self._matrix
+
+    def get_many(self, keys):
+        """(N, dim) array for keys that are all present in the store"""
+        return np.asarray(self.matrix[[self._rows[key] for key in keys]])
+
+    def put_many(self, keys, embeddings):
+        """Append embeddings for keys not stored yet; returns how many were added"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        rows, seen = [], set()
+        for i, key in enumerate(keys):
+            if key not in self._rows and key not in seen:
+                rows.append(i)
+                seen.add(key)
+        if not rows:
+            return 0
+
+        # Vectors first: a crash between the two writes leaves an orphan row, cut off by _read_keys on reopen
+        with open(self.vectors_path, 'ab') as f:
+            f.write(np.ascontiguousarray(embeddings[rows]).tobytes())
+        with open(self.keys_path, 'ab') as f:
+            f.write(b"".join(keys[i] for i in rows))
+
+        for i in rows:
+            self._rows[keys[i]] = len(self._rows)
+        self._matrix = None
+        return len(rows)
+
+    def _read_keys(self):
+        raw = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        rows = self.vectors_path.stat().st_size // (4 * self.dim) if self.vectors_path.exists() else 0
+        count = min(len(raw) // KEY_BYTES, rows)
+
+        # Truncate both files to the rows they share, so the next append's row numbers line up
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != count * 4 * self.dim:
+            os.truncate(self.vectors_path, count * 4 * self.dim)
+        if self.keys_path.exists() and len(raw) != count * KEY_BYTES:
+            os.truncate(self.keys_path, count * KEY_BYTES)
+        return [raw[i * KEY_BYTES:(i + 1) * KEY_BYTES] for i in range(count)]
+
+
+class EmbeddingExtractor:
+    """Batched forward_features extraction that only runs the backbone for unseen images"""
+    def __init__(self, model, store, device='cpu', batch_size=32):
+        self.model = model
+        self.store = store
+        self.store.bind(model_fingerprint(model))
+        self.device = device
+        self.batch_size = batch_size
+
+    def extract(self, image_paths):
+        """(N, dim) features for image_paths, in order; unreadable images get NaN rows"""
+        keys = [self._hash(path) for path in image_paths]
+
+        missing = {}
+        for key, path in zip(keys, image_paths):
+            if key is not None and key not in self.store and key not in missing:
+                missing[key] = path
+        self._compute(list(missing.items()))
+
+        features = np.full((len(keys), self.store.dim), np.nan, dtype=np.float32)
+        known = [i for i, key in enumerate(keys) if key is not None and key in self.store]
+        if known:
+            features[known] = self.store.get_many([keys[i] for i in known])
+        return features
+
+    def _compute(self, items):
+        if items:
+            print(f"🧮 Computing embeddings for {len(items)} new images")
+        for start in range(0, len(items), self.batch_size):
+            chunk = items[start:start + self.batch_size]
+            tensors = [(key, self._load(path)) for key, path in chunk]
+            tensors = [(key, tensor) for key, tensor in tensors if tensor is not None]
+            if not tensors:
+                continue
+            batch = torch.cat([tensor for _, tensor in tensors]).to(self.device)
+            with torch.no_grad():
+                features = self.model.forward_features(batch).cpu().numpy()
+            self.store.put_many([key for key, _ in tensors], features)
+
+    @staticmethod
+    def _hash(path):
+        try:
+            return image_hash(path)
+        except OSError as e:
+            print(f"⚠️ Skipping {path}: {e}")
+            return None
+
+    @staticmethod
+    def _load(path):
+        # Missing, truncated (half-written) or non-image files get no embedding
+        try:
+            with Image.open(path) as image:
+                return IMAGE_TRANSFORM(image.convert('RGB')).unsqueeze(0)
+        except (UnidentifiedImageError, OSError) as e:
+            print(f"⚠️ Skipping {path}: {e}")
+            return None
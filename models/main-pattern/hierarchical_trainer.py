@@ -0,0 +1,122 @@
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+from torchvision import transforms, datasets
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+from trainer import Trainer
+from metrics import ConfusionMatrix
+from swin_transformer import FingerprintSwinWithAttention, constrain_fine_logits
+from pattern_taxonomy import COARSE_CLASSES, FINE_PATTERNS, FINE_TO_COARSE, fine_index
+
+class HierarchicalLoss(nn.Module):
+    """Cross-entropy on the coarse class (derived from the fine label) plus weighted fine cross-entropy"""
+    def __init__(self, fine_weight=1.0):
+        super().__init__()
+        self.fine_weight = fine_weight
+        self.cross_entropy = nn.CrossEntropyLoss()
+        self.register_buffer("fine_to_coarse", torch.tensor(FINE_TO_COARSE))
+
+    def forward(self, outputs, fine_labels):
+        num_coarse = len(COARSE_CLASSES)
+        coarse_loss = self.cross_entropy(outputs[:, :num_coarse], self.fine_to_coarse[fine_labels])
+        fine_loss = self.cross_entropy(outputs[:, num_coarse:], fine_labels)
+        return coarse_loss + self.fine_weight * fine_loss
+
+
+class HierarchicalTrainer(Trainer):
+    """Trains the coarse + fine heads of a hierarchical FingerprintSwinWithAttention.
+
+    Loaders yield fine-pattern indices (see ``fine_pattern_dataset``). Training
+    and validation accuracy, checkpoint selection and the main test report are
+    on the coarse classes; ``test`` additionally reports fine-subtype metrics.
+    """
+    def __init__(self, model, train_loader, val_loader, test_loader=None, device='cpu', lr=1e-4,
+                 fine_weight=1.0, **kwargs):
+        super().__init__(model, train_loader, val_loader, test_loader, device=device, lr=lr, **kwargs)
+        self.criterion = HierarchicalLoss(fine_weight).to(device)
+        self.fine_to_coarse = self.criterion.fine_to_coarse
+        self.num_classes = len(COARSE_CLASSES)
+        self.class_names = COARSE_CLASSES
+
+        self.metrics["test_fine_acc"] = None
+        self.metrics["test_fine_per_class"] = None
+        self.metrics["test_fine_confusion_matrix"] = None
+
+    def predictions(self, outputs, labels):
+        return outputs[:, :self.num_classes].argmax(1), self.fine_to_coarse[labels]
+
+    def test(self):
+        test_acc = super().test()
+        if test_acc is None:
+            return None
+
+        self.model.eval()
+        confusion = ConfusionMatrix(len(FINE_PATTERNS), device=self.device)
+        with torch.no_grad():
+            for images, labels in tqdm(self.test_loader, desc="Testing subtypes", disable=not self.is_main):
+                images, labels = images.to(self.device), labels.to(self.device)
+                outputs = self.model(images)
+                coarse_pred = outputs[:, :self.num_classes].argmax(1)
+                fine_logits = constrain_fine_logits(coarse_pred, outputs[:, self.num_classes:])
+                confusion.update(fine_logits.argmax(1), labels)
+        if self.distributed:
+            dist.all_reduce(confusion.matrix, op=dist.ReduceOp.SUM)
+
+        report = confusion.compute(FINE_PATTERNS)
+        self.metrics["test_fine_acc"] = report["accuracy"]
+        self.metrics["test_fine_per_class"] = report["per_class"]
+        self.metrics["test_fine_confusion_matrix"] = report["confusion_matrix"]
+
+        self._log(f"\n🔬 Subtype Test Accuracy: {report['accuracy']:.2f}%")
+        for pattern, stats in report["per_class"].items():
+            self._log(f"  {pattern:<27} F1 {stats['f1']:.4f} ({stats['correct']}/{stats['support']})")
+
+        self._save_metrics()
+        return test_acc
+
+
+def fine_pattern_dataset(root, transform=None):
+    """ImageFolder over per-subtype folders, relabelled to fine-head indices.
+
+    Folder names are pattern names (or their file-safe form); folders that are
+    not fine subtypes, such as 'Unclear_Damaged Print', are skipped.
+    """
+    dataset = datasets.ImageFolder(root, transform=transform)
+    remap = {idx: fine_index(name) for name, idx in dataset.class_to_idx.items()}
+
+    dataset.samples = [(path, remap[target]) for path, target in dataset.samples if remap[target] is not None]
+    dataset.imgs = dataset.samples
+    dataset.targets = [target for _, target in dataset.samples]
+    dataset.classes = FINE_PATTERNS
+    dataset.class_to_idx = {pattern: i for i, pattern in enumerate(FINE_PATTERNS)}
+    return dataset
+
+
+if __name__ == '__main__':
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print(f"Using device: {device}")
+
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+
+    train_set = fine_pattern_dataset("preprocessed_subtypes/train_set", transform=transform)
+    val_set = fine_pattern_dataset("preprocessed_subtypes/val_set", transform=transform)
+    test_set = fine_pattern_dataset("preprocessed_subtypes/test_set", transform=transform)
+
+    print(f"Train samples: {len(train_set)}, Val samples: {len(val_set)}, Test samples: {len(test_set)}")
+
+    train_loader = DataLoader(train_set, batch_size=16, shuffle=True, num_workers=0)
+    val_loader = DataLoader(val_set, batch_size=16, shuffle=False, num_workers=0)
+    test_loader = DataLoader(test_set, batch_size=16, shuffle=False, num_workers=0)
+
+    model = FingerprintSwinWithAttention(num_classes=len(COARSE_CLASSES), freeze_base=False,
+                                         num_fine_classes=len(FINE_PATTERNS))
+    trainer = HierarchicalTrainer(model, train_loader, val_loader, test_loader, device=device, lr=1e-4)
+
+    trainer.fit(epochs=20)
+    trainer.test()
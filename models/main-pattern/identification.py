@@ -0,0 +1,236 @@
+import os
+import json
+import time
+from pathlib import Path
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import UnidentifiedImageError
+
+from inference import load_model, preprocess_image
+from pattern_taxonomy import COARSE_CLASSES
+from embedding_store import EmbeddingStore, EmbeddingExtractor, model_fingerprint
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif')
+
+
+def embed(model, image_batch, device='cpu'):
+    """L2-normalized 768-d embeddings and coarse-class probabilities from one forward pass"""
+    with torch.no_grad():
+        features = model.forward_features(image_batch.to(device))
+    return embed_features(model, features, device=device)
+
+
+def embed_features(model, features, device='cpu'):
+    """Same as embed() but from already extracted forward_features (only the small heads run)"""
+    features = torch.as_tensor(features, device=device)
+    with torch.no_grad():
+        probabilities = F.softmax(model.classifier(features), dim=1)
+        embeddings = F.normalize(features, dim=1)
+    return embeddings.cpu().numpy().astype(np.float32), probabilities.cpu().numpy()
+
+
+class FingerprintIndex:
+    """Append-only on-disk vector index, bucketed by coarse pattern class.
+
+    Each bucket is a raw float32 matrix (``<bucket>.f32``) plus one id per line
+    (``<bucket>.ids``). Searches memory-map only the buckets being probed and
+    score them with a single matrix-vector product, so lookups stay in the
+    millisecond range as enrollment grows and candidates are pruned by class.
+    ``meta.json`` records the checkpoint the embeddings came from (see ``bind``).
+    """
+    def __init__(self, root, dim=768, buckets=COARSE_CLASSES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.buckets = list(buckets)
+
+        self._ids = {bucket: self._read_ids(bucket) for bucket in self.buckets}
+        self._known = {item for ids in self._ids.values() for item in ids}
+        self._matrices = {}
+
+    def __len__(self):
+        return len(self._known)
+
+    def bind(self, model_id):
+        """Ties the index to one checkpoint; embeddings from different checkpoints are not comparable"""
+        meta_path = self.root / "meta.json"
+        stored = json.loads(meta_path.read_text()).get("model_id") if meta_path.exists() else None
+        if stored is not None and stored != model_id:
+            raise ValueError(f"Index {self.root} was built with another checkpoint; use a new index root "
+                             f"or rebuild it with this model")
+        if stored is None:
+            if self._known:
+                print(f"⚠️ Index {self.root} has no checkpoint record; assuming it matches this model")
+            meta_path.write_text(json.dumps({"model_id": model_id, "dim": self.dim}))
+
+    def __contains__(self, item_id):
+        return item_id in self._known
+
+    def add(self, ids, embeddings, patterns):
+        """Append embeddings (N, dim) under their ids into the bucket of each pattern; known ids are skipped"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        added = 0
+        for bucket in self.buckets:
+            rows = [i for i, (item_id, pattern) in enumerate(zip(ids, patterns))
+                    if pattern == bucket and item_id not in self._known]
+            if not rows:
+                continue
+            with open(self._vectors_path(bucket), 'ab') as f:
+                f.write(np.ascontiguousarray(embeddings[rows]).tobytes())
+            with open(self._ids_path(bucket), 'a') as f:
+                f.writelines(f"{ids[i]}\n" for i in rows)
+            self._ids[bucket].extend(ids[i] for i in rows)
+            self._known.update(ids[i] for i in rows)
+            self._matrices.pop(bucket, None)
+            added += len(rows)
+        return added
+
+    def search(self, embedding, buckets=None, k=5):
+        """Top-k (id, cosine similarity, bucket) across the probed buckets"""
+        query = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        scores, ids, owners = [], [], []
+        for bucket in buckets or self.buckets:
+            matrix = self._matrix(bucket)
+            if matrix is None:
+                continue
+            scores.append(matrix @ query)
+            ids.extend(self._ids[bucket])
+            owners.extend([bucket] * len(matrix))
+        if not scores:
+            return []
+
+        scores = np.concatenate(scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i]), owners[i]) for i in top]
+
+    def _matrix(self, bucket):
+        count = len(self._ids[bucket])
+        if not count:
+            return None
+        if bucket not in self._matrices:
+            self._matrices[bucket] = np.memmap(self._vectors_path(bucket), dtype=np.float32, mode='r',
+                                               shape=(count, self.dim))
+        return self._matrices[bucket]
+
+    def _read_ids(self, bucket):
+        path, vectors = self._ids_path(bucket), self._vectors_path(bucket)
+        ids = []
+        if path.exists():
+            with open(path) as f:
+                ids = [line.rstrip("\n") for line in f if line.endswith("\n") and line.strip()]
+        rows = vectors.stat().st_size // (4 * self.dim) if vectors.exists() else 0
+
+        # add() writes vectors before ids, so an interrupted append leaves orphan vector rows
+        # (or a torn ids line). Cut both files back to the rows they share, otherwise the next
+        # append would pair new ids with the orphan rows.
+        count = min(len(ids), rows)
+        if vectors.exists() and vectors.stat().st_size != count * 4 * self.dim:
+            os.truncate(vectors, count * 4 * self.dim)
+        if path.exists() and (len(ids) != count or path.stat().st_size != sum(len(i.encode()) + 1 for i in ids)):
+            with open(path, 'w') as f:
+                f.writelines(f"{item_id}\n" for item_id in ids[:count])
+        return ids[:count]
+
+    def _vectors_path(self, bucket):
+        return self.root / f"{bucket}.f32"
+
+    def _ids_path(self, bucket):
+        return self.root / f"{bucket}.ids"
+
+
+def probe_buckets(probabilities, class_names=COARSE_CLASSES, min_confidence=0.8):
+    """Most likely bucket, plus the runner-up when the pattern call is not confident"""
+    order = np.argsort(-probabilities)
+    buckets = [class_names[order[0]]]
+    if probabilities[order[0]] < min_confidence:
+        buckets.append(class_names[order[1]])
+    return buckets
+
+
+def enroll_capture_store(model, data_root, index, device='cpu', batch_size=16, extractor=None):
+    """Embed every capture under data/<uuid>/ not yet in the index; ids are '<uuid>/<file>'.
+
+    With an EmbeddingExtractor, backbone features come from (and go into) its
+    hash-keyed store instead of being recomputed. Unreadable or half-written
+    captures are skipped with a warning and picked up by the next run.
+    """
+    index.bind(model_fingerprint(model))
+    data_root = Path(data_root)
+    pending = []
+    for patient_dir in sorted(p for p in data_root.iterdir() if p.is_dir()):
+        for image_path in sorted(patient_dir.iterdir()):
+            item_id = f"{patient_dir.name}/{image_path.name}"
+            if image_path.suffix.lower() in IMAGE_EXTENSIONS and item_id not in index:
+                pending.append((item_id, image_path))
+
+    added = 0
+    if extractor is not None and pending:
+        features = extractor.extract([path for _, path in pending])
+        readable = ~np.isnan(features).any(axis=1)
+        pending = [item for item, ok in zip(pending, readable) if ok]
+        if pending:
+            embeddings, probabilities = embed_features(model, features[readable], device=device)
+            patterns = [COARSE_CLASSES[i] for i in probabilities.argmax(axis=1)]
+            added = index.add([item_id for item_id, _ in pending], embeddings, patterns)
+        pending = []
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        tensors = [_load_capture(path) for _, path in chunk]
+        chunk = [item for item, tensor in zip(chunk, tensors) if tensor is not None]
+        if not chunk:
+            continue
+        embeddings, probabilities = embed(model, torch.cat([t for t in tensors if t is not None]), device=device)
+        patterns = [COARSE_CLASSES[i] for i in probabilities.argmax(axis=1)]
+        added += index.add([item_id for item_id, _ in chunk], embeddings, patterns)
+
+    print(f"✅ Enrolled {added} new captures ({len(index)} in index)")
+    return added
+
+
+def _load_capture(image_path):
+    try:
+        return preprocess_image(image_path)
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"⚠️ Skipping {image_path}: {e}")
+        return None
+
+
+def identify(model, index, image_path, device='cpu', k=5, min_confidence=0.8):
+    """Top-k enrolled captures most similar to a new print, with the owning patient uuid"""
+    index.bind(model_fingerprint(model))
+    image_tensor = preprocess_image(image_path)
+    if image_tensor is None:
+        return []
+    embeddings, probabilities = embed(model, image_tensor, device=device)
+    buckets = probe_buckets(probabilities[0], min_confidence=min_confidence)
+    return [
+        {"id": item_id, "patient_uuid": item_id.split("/", 1)[0], "score": score, "bucket": bucket}
+        for item_id, score, bucket in index.search(embeddings[0], buckets=buckets, k=k)
+    ]
+
+
+if __name__ == '__main__':
+
+    MODEL_PATH = r"path"
+    DATA_ROOT = os.path.join("..", "..", "desktop", "data")
+    INDEX_ROOT = "identification_index"
+    EMBEDDING_STORE_ROOT = "embedding_store"
+    QUERY_PATH = "fingerprint.bmp"
+
+    DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = load_model(MODEL_PATH, num_classes=len(COARSE_CLASSES), device=DEVICE)
+
+    if model is not None:
+        index = FingerprintIndex(INDEX_ROOT)
+        extractor = EmbeddingExtractor(model, EmbeddingStore(EMBEDDING_STORE_ROOT), device=DEVICE)
+        enroll_capture_store(model, DATA_ROOT, index, device=DEVICE, extractor=extractor)
+
+        start = time.perf_counter()
+        matches = identify(model, index, QUERY_PATH, device=DEVICE)
+        print(f"\n🔎 Top matches for {QUERY_PATH} ({(time.perf_counter() - start) * 1000:.1f} ms):")
+        for match in matches:
+            print(f"  - {match['patient_uuid']}  {match['id']}  score {match['score']:.4f}  [{match['bucket']}]")
@@ -1,28 +1,46 @@
+import time
+import cv2
 import torch
 from torchvision import transforms
+import torchvision.transforms.functional as TF
 from PIL import Image
 import torch.nn.functional as F
 
 
 from swin_transformer import FingerprintSwinWithAttention
+from pattern_taxonomy import COARSE_CLASSES, FINE_PATTERNS
+from data_cleaner import binarize_ridge_map
+from orientation_field import classify_singular_points
+from roi import CropToROI, crop_to_roi
 
-def load_model(model_path, num_classes=3, device='cpu'):
+def load_model(model_path, num_classes=3, device='cpu', num_fine_classes=0):
     """
     Loads the trained model from a .pth file.
+    Pass num_fine_classes=len(FINE_PATTERNS) for a hierarchical checkpoint,
+    or None to detect it from the checkpoint.
     """
     print(f"Loading model from: {model_path}")
     
 
-    model = FingerprintSwinWithAttention(num_classes=num_classes, freeze_base=False)
-
     try:
         checkpoint = torch.load(model_path, map_location=device)
     except FileNotFoundError:
         print(f"❌ Error: Model file not found at {model_path}")
         return None
-        
 
-    model.load_state_dict(checkpoint['model_state_dict'])
+    state = checkpoint['model_state_dict']
+    if num_fine_classes is None:
+        num_fine_classes = len(FINE_PATTERNS) if any(k.startswith("fine_classifier.") for k in state) else 0
+
+    model = FingerprintSwinWithAttention(num_classes=num_classes, freeze_base=False, fused=True,
+                                         num_fine_classes=num_fine_classes)
+    model.load_state_dict(state)
+
+    # Output order the checkpoint was trained with (older checkpoints: ImageFolder order)
+    model.class_names = checkpoint.get('class_names') or COARSE_CLASSES[:num_classes]
+    if model.class_names != COARSE_CLASSES[:num_classes]:
+        print(f"⚠️ Checkpoint class order {model.class_names} differs from {COARSE_CLASSES}; "
+              f"use model.class_names to label its outputs")
     
 
     model.to(device)
@@ -31,16 +49,17 @@ def load_model(model_path, num_classes=3, device='cpu'):
     print("✅ Model loaded successfully.")
     return model
 
+IMAGE_TRANSFORM = transforms.Compose([
+    CropToROI(),
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
 def preprocess_image(image_path):
     """
     Loads an image, resizes it, and applies the necessary transformations.
     """
-
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
     
 
     try:
@@ -50,18 +69,61 @@ def preprocess_image(image_path):
         return None
         
     
-    return transform(image).unsqueeze(0)
+    return IMAGE_TRANSFORM(image).unsqueeze(0)
+
+# Normalized value of a black pixel, used to fill corners exposed by rotation
+BLACK_FILL = [(0.0 - m) / sd for m, sd in zip([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])]
 
-def predict(model, image_tensor, class_names, device='cpu'):
+# TTA views in priority order: (horizontal flip, rotation in degrees, central crop fraction)
+TTA_VIEWS = [
+    (False, 0, 1.0),
+    (True, 0, 1.0),
+    (False, 5, 1.0),
+    (False, -5, 1.0),
+    (False, 0, 0.9),
+    (True, 5, 1.0),
+    (True, -5, 1.0),
+    (False, 10, 1.0),
+    (False, -10, 1.0),
+    (True, 0, 0.9),
+]
+
+def build_tta_views(image_tensor, num_views):
+    """
+    Expands a (1, 3, H, W) image tensor into a (num_views, 3, H, W) batch of
+    flipped, slightly rotated and centre-cropped views (the first is the original).
+    Flips mirror loop direction, so use TTA for coarse classes only.
+    """
+    
+    image = image_tensor[0]
+    height, width = image.shape[-2:]
+    views = []
+    for flip, angle, crop in TTA_VIEWS[:num_views]:
+        view = TF.hflip(image) if flip else image
+        if angle:
+            view = TF.rotate(view, angle, interpolation=transforms.InterpolationMode.BILINEAR, fill=BLACK_FILL)
+        if crop < 1.0:
+            view = TF.resized_crop(view, int(height * (1 - crop) / 2), int(width * (1 - crop) / 2),
+                                   int(height * crop), int(width * crop), [height, width], antialias=True)
+        views.append(view)
+    return torch.stack(views)
+
+def predict(model, image_tensor, class_names, device='cpu', tta_views=1):
     """
     Performs inference on a single image tensor and returns the prediction.
+    With tta_views > 1 the augmented views go through the model as one batch
+    and their logits are averaged.
     """
     
+    if tta_views > 1:
+        image_tensor = build_tta_views(image_tensor, tta_views)
     image_tensor = image_tensor.to(device)
     
     with torch.no_grad():
        
         outputs = model(image_tensor)
+        if tta_views > 1:
+            outputs = outputs.mean(dim=0, keepdim=True)
         
         
         probabilities = F.softmax(outputs, dim=1)[0]
@@ -74,12 +136,149 @@ def predict(model, image_tensor, class_names, device='cpu'):
     
     return predicted_class, confidence.item(), probabilities.cpu().numpy()
 
+def measure_tta_latency(model, image_tensor, class_names, view_counts=(1, 2, 4, 6, 10), device='cpu', repeats=5):
+    """
+    Median predict() latency in milliseconds for each TTA view count.
+    """
+    
+    latencies = {}
+    for views in view_counts:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict(model, image_tensor, class_names, device=device, tta_views=views)
+            timings.append((time.perf_counter() - start) * 1000.)
+        latencies[views] = sorted(timings)[len(timings) // 2]
+    return latencies
+
+def predict_hierarchical(model, image_tensor, device='cpu', fine_threshold=0.6):
+    """
+    Coarse pattern for a single image tensor, plus the fine subtype when the
+    coarse confidence is at least fine_threshold (otherwise fine_pattern is None).
+    """
+    
+    image_tensor = image_tensor.to(device)
+    
+    with torch.no_grad():
+        coarse_probs, fine_probs, gate = model.forward_hierarchical(image_tensor, fine_threshold=fine_threshold)
+    
+    coarse_confidence, coarse_idx = torch.max(coarse_probs[0], 0)
+    result = {
+        "pattern": COARSE_CLASSES[coarse_idx.item()],
+        "confidence": coarse_confidence.item(),
+        "fine_pattern": None,
+        "fine_confidence": None,
+        "probabilities": coarse_probs[0].cpu().numpy()
+    }
+    
+    # A model without a fine head (num_fine_classes=0) only gives the coarse result
+    if gate[0] and model.num_fine_classes:
+        fine_confidence, fine_idx = torch.max(fine_probs[0], 0)
+        result["fine_pattern"] = FINE_PATTERNS[fine_idx.item()]
+        result["fine_confidence"] = fine_confidence.item()
+    
+    return result
+
+def preprocess_frames(frames):
+    """
+    Stacks grayscale uint8 frames (e.g. scanner captures) into one batch tensor,
+    using the same transformations as preprocess_image.
+    """
+    
+    return torch.stack([IMAGE_TRANSFORM(Image.fromarray(frame).convert('RGB')) for frame in frames])
+
+def predict_batch(model, image_batch, class_names, device='cpu', fine_threshold=0.6):
+    """
+    Classifies a whole batch (e.g. every finger of a session) in one forward pass.
+    Returns one result dict per image; hierarchical models also fill in the fine subtype.
+    """
+    
+    image_batch = image_batch.to(device)
+    
+    with torch.no_grad():
+        if getattr(model, "fine_classifier", None) is not None:
+            probabilities, fine_probs, gate = model.forward_hierarchical(image_batch, fine_threshold=fine_threshold)
+        else:
+            probabilities = F.softmax(model(image_batch), dim=1)
+            fine_probs, gate = None, None
+        confidences, predicted = torch.max(probabilities, 1)
+    
+    results = []
+    for i in range(image_batch.size(0)):
+        result = {
+            "pattern": class_names[predicted[i].item()],
+            "confidence": confidences[i].item(),
+            "probabilities": dict(zip(class_names, probabilities[i].tolist()))
+        }
+        if gate is not None:
+            fine_confidence, fine_idx = torch.max(fine_probs[i], 0)
+            result["fine_pattern"] = FINE_PATTERNS[fine_idx.item()] if gate[i] else None
+            result["fine_confidence"] = fine_confidence.item() if gate[i] else None
+        results.append(result)
+    
+    return results
+
+def predict_cascade(model, image_path, class_names, device='cpu', threshold=0.6):
+    """
+    Two-stage prediction: the singular-point heuristic on the binarized ridge map
+    answers when its confidence reaches threshold; otherwise the Swin model does.
+    """
+    
+    start = time.perf_counter()
+    gray = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        print(f"❌ Error: Could not read image at {image_path}")
+        return None
+    
+    first_stage = classify_singular_points(binarize_ridge_map(crop_to_roi(gray)))
+    if first_stage["pattern"] in class_names and first_stage["confidence"] >= threshold:
+        return {
+            "pattern": first_stage["pattern"],
+            "confidence": first_stage["confidence"],
+            "stage": "singular_points",
+            "latency_ms": (time.perf_counter() - start) * 1000.
+        }
+    
+    image_tensor = preprocess_image(image_path)
+    predicted_class, confidence, _ = predict(model, image_tensor, class_names, device=device)
+    return {
+        "pattern": predicted_class,
+        "confidence": confidence,
+        "stage": "swin",
+        "latency_ms": (time.perf_counter() - start) * 1000.
+    }
+
+def run_cascade(model, image_paths, class_names, device='cpu', threshold=0.6):
+    """
+    Runs predict_cascade over many images and summarizes how often the
+    first stage short-circuited the Swin model and the end-to-end latency.
+    """
+    
+    results = {}
+    for image_path in image_paths:
+        result = predict_cascade(model, image_path, class_names, device=device, threshold=threshold)
+        if result is not None:
+            results[str(image_path)] = result
+    
+    latencies = [r["latency_ms"] for r in results.values()]
+    short_circuited = [r for r in results.values() if r["stage"] == "singular_points"]
+    summary = {
+        "images": len(results),
+        "threshold": threshold,
+        "short_circuit_fraction": len(short_circuited) / len(results) if results else 0.0,
+        "mean_latency_ms": sum(latencies) / len(latencies) if latencies else 0.0
+    }
+    return results, summary
+
 if __name__ == '__main__':
 
     MODEL_PATH = r"path"  
     IMAGE_PATH = "fingerprint.bmp"                 
 
-    CLASS_NAMES = ['Arch', 'Whorl', 'Loop']
+    CLASS_NAMES = COARSE_CLASSES
+    USE_CASCADE = False
+    CASCADE_THRESHOLD = 0.6
+    TTA_VIEWS_COUNT = 1
     
 
     DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -89,11 +288,13 @@ if __name__ == '__main__':
     
     if model is not None:
 
+        CLASS_NAMES = model.class_names
         image_tensor = preprocess_image(IMAGE_PATH)
         
         if image_tensor is not None:
             
-            predicted_class, confidence, all_probabilities = predict(model, image_tensor, CLASS_NAMES, device=DEVICE)
+            predicted_class, confidence, all_probabilities = predict(model, image_tensor, CLASS_NAMES, device=DEVICE,
+                                                                     tta_views=TTA_VIEWS_COUNT)
 
             print("\n" + "="*30)
             print("🔍 Inference Results")
@@ -105,3 +306,8 @@ if __name__ == '__main__':
             for i, class_name in enumerate(CLASS_NAMES):
                 print(f"  - {class_name:<10}: {all_probabilities[i]:.2%}")
             print("="*30)
+
+        if USE_CASCADE:
+            _, summary = run_cascade(model, [IMAGE_PATH], CLASS_NAMES, device=DEVICE, threshold=CASCADE_THRESHOLD)
+            print(f"\n⚡ Cascade: {summary['short_circuit_fraction']:.0%} short-circuited, "
+                  f"mean latency {summary['mean_latency_ms']:.1f} ms")
@@ -0,0 +1,249 @@
+import json
+import time
+import asyncio
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from inference import load_model, preprocess_frames
+from pattern_taxonomy import COARSE_CLASSES
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def preprocess_frame(frame_bytes, width, height):
+    """Raw 8-bit grayscale scanner frame → normalized (3, 224, 224) tensor (same transform as inference.preprocess_image)"""
+    if width <= 0 or height <= 0:
+        raise ValueError(f"width and height must be positive, got {width}x{height}")
+    if len(frame_bytes) != width * height:
+        raise ValueError(f"expected {width * height} bytes for a {width}x{height} frame, got {len(frame_bytes)}")
+    frame = np.frombuffer(frame_bytes, dtype=np.uint8).reshape(height, width)
+    return preprocess_frames([frame])[0]
+
+
+class Histogram:
+    """Fixed-bucket histogram with cumulative (Prometheus-style) counts"""
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def to_dict(self):
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            running += count
+            cumulative[f"le_{bound}"] = running
+        return {
+            "buckets": cumulative,
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0
+        }
+
+
+class MicroBatcher:
+    """Groups concurrent requests into one forward pass.
+
+    The first queued frame opens a batch; frames arriving within ``max_wait_ms``
+    join it until ``max_batch_size`` is reached. The forward runs on a worker
+    thread so the event loop keeps accepting requests meanwhile.
+    """
+    def __init__(self, model, class_names, device='cpu', max_batch_size=16, max_wait_ms=5):
+        self.model = model
+        self.class_names = class_names
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.latency_ms = Histogram([5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000])
+        self.forward_ms = Histogram([5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000])
+        self.requests = 0
+        self.errors = 0
+
+    async def submit(self, image_tensor):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image_tensor, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            images = torch.stack([item[0] for item in batch])
+            start = time.perf_counter()
+            try:
+                probabilities = await loop.run_in_executor(self.executor, self._forward, images)
+            except Exception as e:
+                self.errors += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            self.batch_sizes.observe(len(batch))
+            self.forward_ms.observe((finished - start) * 1000.)
+            for (_, future, enqueued), probs in zip(batch, probabilities):
+                self.latency_ms.observe((finished - enqueued) * 1000.)
+                self.requests += 1
+                if not future.done():
+                    future.set_result(probs)
+
+    def _forward(self, images):
+        with torch.inference_mode():
+            outputs = self.model(images.to(self.device))
+            return F.softmax(outputs, dim=1).cpu()
+
+    def result(self, probabilities):
+        confidence, predicted_idx = torch.max(probabilities, 0)
+        return {
+            "pattern": self.class_names[predicted_idx.item()],
+            "confidence": confidence.item(),
+            "probabilities": dict(zip(self.class_names, probabilities.tolist()))
+        }
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.,
+            "batch_size": self.batch_sizes.to_dict(),
+            "latency_ms": self.latency_ms.to_dict(),
+            "forward_ms": self.forward_ms.to_dict()
+        }
+
+
+class InferenceServer:
+    """Minimal HTTP/1.1 front end (stdlib asyncio only) for a shared MicroBatcher.
+
+    POST /predict?width=W&height=H  body: raw 8-bit grayscale frame
+    GET  /metrics                   queue depth, batch size and latency histograms
+    GET  /health
+
+    Frames are decoded and transformed on a small thread pool, so the event
+    loop keeps accepting requests while CPU-bound preprocessing runs.
+    """
+    def __init__(self, batcher, host="127.0.0.1", port=8000, max_body_bytes=16 * 2 ** 20, preprocess_workers=4):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.preprocess_executor = ThreadPoolExecutor(max_workers=preprocess_workers)
+
+    async def serve_forever(self):
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"🌐 Inference server listening on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body_bytes:
+                    await self._respond(writer, 413, {"error": "frame too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self._route(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/metrics":
+            return 200, self.batcher.metrics()
+        if url.path != "/predict":
+            return 404, {"error": f"unknown path {url.path}"}
+        if method != "POST":
+            return 405, {"error": "use POST with a raw grayscale frame"}
+
+        query = parse_qs(url.query)
+        try:
+            width = int(query["width"][0])
+            height = int(query["height"][0])
+            image_tensor = await asyncio.get_running_loop().run_in_executor(
+                self.preprocess_executor, preprocess_frame, body, width, height)
+        except (KeyError, ValueError) as e:
+            return 400, {"error": f"bad frame: {e}"}
+
+        probabilities = await self.batcher.submit(image_tensor)
+        return 200, self.batcher.result(probabilities)
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+if __name__ == '__main__':
+
+    MODEL_PATH = r"path"
+    CLASS_NAMES = COARSE_CLASSES
+
+    DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print(f"Using device: {DEVICE}")
+
+    model = load_model(MODEL_PATH, num_classes=len(CLASS_NAMES), device=DEVICE)
+
+    if model is not None:
+        batcher = MicroBatcher(model, model.class_names, device=DEVICE, max_batch_size=16, max_wait_ms=5)
+        server = InferenceServer(batcher, host="127.0.0.1", port=8000)
+        asyncio.run(server.serve_forever())
@@ -1,13 +1,30 @@
+import os
 import torch
+import torch.distributed as dist
 from torchvision import transforms, datasets
 from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from swin_transformer import FingerprintSwinWithAttention
-from trainer import Trainer
+from trainer import Trainer, UnpaddedDistributedSampler
 
 if __name__ == '__main__':
 
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    print(f"Using device: {device}")
+    # Launched with torchrun (e.g. `torchrun --nproc_per_node=4 main.py`) → DDP over gloo
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    distributed = world_size > 1
+
+    if distributed:
+        dist.init_process_group(backend="gloo")
+        device = 'cpu'
+        # Split the cores between the processes on this node instead of oversubscribing them
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    else:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    is_main = not distributed or dist.get_rank() == 0
+
+    if is_main:
+        print(f"Using device: {device}")
 
     transform = transforms.Compose([
         transforms.Resize((224, 224)),
@@ -15,20 +32,57 @@ if __name__ == '__main__':
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
     ])
 
-    train_set = datasets.ImageFolder("preprocessed_data/train_set", transform=transform)
-    val_set = datasets.ImageFolder("preprocessed_data/val_set", transform=transform)
-    test_set = datasets.ImageFolder("preprocessed_data/test_set", transform=transform)
+    # SPLIT_MANIFESTS=<dir> trains on the patient-grouped manifests from split_manifest.py instead,
+    # ARCHIVE_SHARDS=<dir> on the TAR shards written by DatasetPreprocessor.process_archive
+    manifest_dir = os.environ.get("SPLIT_MANIFESTS")
+    shard_dir = os.environ.get("ARCHIVE_SHARDS")
+    if manifest_dir:
+        from split_manifest import ManifestDataset
+        from data_cleaner import DatasetPreprocessor
+        # Manifests list raw captures: binarize them on the fly like preprocessed_data
+        preprocess = DatasetPreprocessor(manifest_dir, output_root=manifest_dir).preprocess_array
+        train_set = ManifestDataset(os.path.join(manifest_dir, "train.csv"), transform=transform, preprocess=preprocess)
+        val_set = ManifestDataset(os.path.join(manifest_dir, "val.csv"), transform=transform, preprocess=preprocess)
+        test_set = ManifestDataset(os.path.join(manifest_dir, "test.csv"), transform=transform, preprocess=preprocess)
+    elif shard_dir:
+        from glob import glob
+        from archive_io import ArchiveImageDataset
+        shards = sorted(glob(os.path.join(shard_dir, "*.tar")))
+        train_set = ArchiveImageDataset(shards, prefix="train_set/", transform=transform)
+        val_set = ArchiveImageDataset(shards, prefix="val_set/", transform=transform)
+        test_set = ArchiveImageDataset(shards, prefix="test_set/", transform=transform)
+    else:
+        train_set = datasets.ImageFolder("preprocessed_data/train_set", transform=transform)
+        val_set = datasets.ImageFolder("preprocessed_data/val_set", transform=transform)
+        test_set = datasets.ImageFolder("preprocessed_data/test_set", transform=transform)
+
+    if is_main:
+        print(f"Train samples: {len(train_set)}, Val samples: {len(val_set)}, Test samples: {len(test_set)}")
+        print(f"Classes: {train_set.classes}")
 
-    print(f"Train samples: {len(train_set)}, Val samples: {len(val_set)}, Test samples: {len(test_set)}")
-    print(f"Classes: {train_set.classes}")
+    if distributed:
+        train_sampler = DistributedSampler(train_set, shuffle=True)
+        # DistributedSampler pads with duplicates; evaluation needs every image exactly once
+        val_sampler = UnpaddedDistributedSampler(val_set)
+        test_sampler = UnpaddedDistributedSampler(test_set)
+    else:
+        train_sampler = val_sampler = test_sampler = None
 
-    train_loader = DataLoader(train_set, batch_size=16, shuffle=True, num_workers=0)
-    val_loader = DataLoader(val_set, batch_size=16, shuffle=False, num_workers=0)
-    test_loader = DataLoader(test_set, batch_size=16, shuffle=False, num_workers=0)
+    train_loader = DataLoader(train_set, batch_size=16, shuffle=train_sampler is None, sampler=train_sampler, num_workers=0)
+    val_loader = DataLoader(val_set, batch_size=16, shuffle=False, sampler=val_sampler, num_workers=0)
+    test_loader = DataLoader(test_set, batch_size=16, shuffle=False, sampler=test_sampler, num_workers=0)
+
+    # Opt-in instrumentation: PROFILE_TRAINING=1 for phase timings, PROFILE_TRACE_STEPS=N for a torch.profiler trace
+    profile = os.environ.get("PROFILE_TRAINING") == "1"
+    trace_steps = int(os.environ.get("PROFILE_TRACE_STEPS", 0)) or None
 
     model = FingerprintSwinWithAttention(num_classes=3, freeze_base=False)
-    trainer = Trainer(model, train_loader, val_loader, test_loader, device=device, lr=1e-4)
+    trainer = Trainer(model, train_loader, val_loader, test_loader, device=device, lr=1e-4, distributed=distributed,
+                      profile=profile or trace_steps is not None, profile_trace_steps=trace_steps)
 
 
     trainer.fit(epochs=20)
     trainer.test()
+
+    if distributed:
+        dist.destroy_process_group()
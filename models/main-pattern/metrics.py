@@ -0,0 +1,58 @@
+import torch
+
+
+class ConfusionMatrix:
+    """Confusion matrix accumulated on-device with a single bincount per batch"""
+    def __init__(self, num_classes, device='cpu'):
+        self.num_classes = num_classes
+        self.matrix = torch.zeros(num_classes, num_classes, dtype=torch.int64, device=device)
+
+    def update(self, predicted, labels):
+        # Rows are true labels, columns are predictions
+        indices = labels.view(-1) * self.num_classes + predicted.view(-1)
+        counts = torch.bincount(indices, minlength=self.num_classes ** 2)
+        self.matrix += counts.view(self.num_classes, self.num_classes)
+
+    @property
+    def correct(self):
+        return int(self.matrix.diagonal().sum().item())
+
+    @property
+    def total(self):
+        return int(self.matrix.sum().item())
+
+    @property
+    def accuracy(self):
+        total = self.total
+        return 100. * self.correct / total if total else 0.0
+
+    def compute(self, class_names=None):
+        """Per-class precision/recall/F1 plus the raw matrix, ready for JSON"""
+        matrix = self.matrix.double().cpu()
+        true_positive = matrix.diagonal()
+        support = matrix.sum(dim=1)
+        predicted_count = matrix.sum(dim=0)
+
+        precision = true_positive / predicted_count.clamp(min=1)
+        recall = true_positive / support.clamp(min=1)
+        f1 = 2 * precision * recall / (precision + recall).clamp(min=1e-12)
+
+        if class_names is None:
+            class_names = [str(i) for i in range(self.num_classes)]
+
+        per_class = {}
+        for i, name in enumerate(class_names):
+            per_class[name] = {
+                "precision": precision[i].item(),
+                "recall": recall[i].item(),
+                "f1": f1[i].item(),
+                "support": int(support[i].item()),
+                "correct": int(true_positive[i].item())
+            }
+
+        return {
+            "accuracy": self.accuracy,
+            "macro_f1": f1.mean().item(),
+            "per_class": per_class,
+            "confusion_matrix": self.matrix.cpu().tolist()
+        }
@@ -0,0 +1,122 @@
+import json
+import time
+import atexit
+import queue
+import threading
+from pathlib import Path
+
+# Per-epoch histories in training_metrics.json, filled from "epoch" events
+HISTORY_KEYS = {
+    "train_loss": "train_loss",
+    "train_acc": "train_acc",
+    "val_loss": "val_loss",
+    "val_acc": "val_acc",
+    "learning_rates": "lr",
+}
+
+
+class MetricsWriter:
+    """Append-only JSONL metrics log written by a background thread.
+
+    ``log`` only enqueues a record, so the training loop never waits on disk.
+    The writer thread drains the queue in batches and flushes at most every
+    ``flush_interval`` seconds, giving a steady trickle of small appends
+    instead of a full rewrite per epoch.
+    """
+    def __init__(self, path, flush_interval=1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event, **fields):
+        if not self._closed:
+            self._queue.put({"event": event, "time": time.time(), **fields})
+
+    def flush(self):
+        """Block until everything logged so far is on disk"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                records = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                # Gather whatever else arrives before the deadline into the same write
+                while records[-1] is not None:
+                    try:
+                        records.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+                done = records[-1] is None
+                lines = [json.dumps(record) + "\n" for record in records if record is not None]
+                f.writelines(lines)
+                f.flush()
+                for _ in records:
+                    self._queue.task_done()
+                if done:
+                    return
+
+
+def read_metrics(path):
+    """Yield the records of a metrics log, skipping a partially written last line (safe on live runs)"""
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def summarize(path):
+    """Rebuild the training_metrics.json summary from a metrics log"""
+    summary = {key: [] for key in HISTORY_KEYS}
+    summary.update({"test_acc": None, "test_macro_f1": None, "test_per_class": None,
+                    "test_confusion_matrix": None, "best_epoch": 0})
+    for record in read_metrics(path):
+        if record["event"] == "epoch":
+            for key, field in HISTORY_KEYS.items():
+                summary[key].append(record[field])
+            summary["best_epoch"] = record.get("best_epoch", summary["best_epoch"])
+        elif record["event"] == "metrics":
+            summary.update({k: v for k, v in record.items() if k not in ("event", "time")})
+    return summary
+
+
+def step_statistics(path, window=50):
+    """Mean loss and throughput over the last ``window`` training steps of a metrics log"""
+    steps = [record for record in read_metrics(path) if record["event"] == "step"][-window:]
+    if not steps:
+        return None
+    return {
+        "step": steps[-1]["step"],
+        "epoch": steps[-1]["epoch"],
+        "loss": sum(record["loss"] for record in steps) / len(steps),
+        "samples_per_sec": sum(record["samples_per_sec"] for record in steps) / len(steps),
+        "lr": steps[-1]["lr"],
+    }
+
+
+if __name__ == "__main__":
+    log_path = r"path"  # e.g. training_logs/run_<id>/metrics.jsonl
+
+    stats = step_statistics(log_path)
+    summary = summarize(log_path)
+    if stats is not None:
+        print(f"📈 Epoch {stats['epoch']}, step {stats['step']}: loss {stats['loss']:.4f}, "
+              f"{stats['samples_per_sec']:.1f} samples/s, lr {stats['lr']:.6f}")
+    for epoch, (val_loss, val_acc) in enumerate(zip(summary["val_loss"], summary["val_acc"]), 1):
+        print(f"Epoch {epoch}: Val Loss {val_loss:.4f}, Val Acc {val_acc:.2f}%")
@@ -0,0 +1,144 @@
+from collections import defaultdict
+import cv2
+import numpy as np
+from orientation_field import orientation_field
+
+RIDGE_ENDING = 1
+BIFURCATION = 3
+
+MINUTIAE_DTYPE = np.dtype([
+    ("x", np.uint16),
+    ("y", np.uint16),
+    ("angle", np.float32),    # local ridge orientation in radians, [0, π)
+    ("type", np.uint8),       # RIDGE_ENDING or BIFURCATION (the crossing number)
+    ("quality", np.float32),  # orientation coherence of the surrounding block
+])
+
+# Neighbours P2..P9 clockwise from north, as (dy, dx); bit i of a neighbourhood code is P(i + 2)
+NEIGHBOUR_OFFSETS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def _build_lookup_tables():
+    """Per-code lookup tables for both Zhang-Suen sub-iterations and the crossing number"""
+    step_one = np.zeros(256, dtype=bool)
+    step_two = np.zeros(256, dtype=bool)
+    crossing = np.zeros(256, dtype=np.uint8)
+    for code in range(256):
+        p = [(code >> i) & 1 for i in range(8)]
+        p2, p3, p4, p5, p6, p7, p8, p9 = p
+        neighbours = sum(p)
+        transitions = sum(p[i] == 0 and p[(i + 1) % 8] == 1 for i in range(8))
+        removable = 2 <= neighbours <= 6 and transitions == 1
+        step_one[code] = removable and p2 * p4 * p6 == 0 and p4 * p6 * p8 == 0
+        step_two[code] = removable and p2 * p4 * p8 == 0 and p2 * p6 * p8 == 0
+        crossing[code] = sum(abs(p[i] - p[(i + 1) % 8]) for i in range(8)) // 2
+    return step_one, step_two, crossing
+
+
+ZS_STEP_ONE, ZS_STEP_TWO, CROSSING_NUMBER = _build_lookup_tables()
+
+
+def neighbourhood_codes(skeleton):
+    """8-bit code of each pixel's 8-neighbourhood, computed with array shifts"""
+    padded = np.pad(skeleton.astype(np.uint8), 1)
+    height, width = skeleton.shape
+    codes = np.zeros((height, width), dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(NEIGHBOUR_OFFSETS):
+        codes |= padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width] << bit
+    return codes
+
+
+def thin(ridge_map):
+    """One-pixel-wide skeleton of a white-ridge binary image (bool array)"""
+    binary = (ridge_map > 0).astype(np.uint8)
+    if hasattr(cv2, "ximgproc"):
+        return cv2.ximgproc.thinning(binary * 255, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN) > 0
+
+    # Vectorized Zhang-Suen: every pass is a handful of whole-image shifts and a table lookup
+    skeleton = binary.astype(bool)
+    while True:
+        changed = False
+        for table in (ZS_STEP_ONE, ZS_STEP_TWO):
+            remove = skeleton & table[neighbourhood_codes(skeleton)]
+            if remove.any():
+                skeleton &= ~remove
+                changed = True
+        if not changed:
+            return skeleton
+
+
+def extract_minutiae(ridge_map, block_size=16, border_blocks=1, min_distance=8):
+    """Ridge endings and bifurcations of a binarized ridge map as a MINUTIAE_DTYPE array.
+
+    Pipeline: Zhang-Suen thinning → crossing number → block orientation →
+    spurious-minutiae filtering. Minutiae within ``border_blocks`` of the
+    foreground edge are dropped (ridges end there artificially), as are
+    pairs closer than ``min_distance`` pixels (broken ridges, spurs, bridges).
+    """
+    skeleton = thin(ridge_map)
+    crossing = CROSSING_NUMBER[neighbourhood_codes(skeleton)]
+    candidates = skeleton & ((crossing == RIDGE_ENDING) | (crossing == BIFURCATION))
+    ys, xs = np.nonzero(candidates)
+
+    orientation, coherence, mask = orientation_field(ridge_map, block_size=block_size)
+    if border_blocks:
+        kernel = np.ones((2 * border_blocks + 1, 2 * border_blocks + 1), np.uint8)
+        mask = cv2.erode(mask.astype(np.uint8), kernel).astype(bool)
+
+    rows = np.minimum(ys // block_size, mask.shape[0] - 1)
+    cols = np.minimum(xs // block_size, mask.shape[1] - 1)
+    inside = mask[rows, cols]
+    ys, xs, rows, cols = ys[inside], xs[inside], rows[inside], cols[inside]
+
+    minutiae = np.empty(len(ys), dtype=MINUTIAE_DTYPE)
+    minutiae["x"] = xs
+    minutiae["y"] = ys
+    minutiae["angle"] = orientation[rows, cols]
+    minutiae["type"] = crossing[ys, xs]
+    minutiae["quality"] = coherence[rows, cols]
+
+    return _remove_close_pairs(minutiae, min_distance)
+
+
+def _remove_close_pairs(minutiae, min_distance):
+    """Drop every minutia that has another one closer than min_distance.
+
+    Points are bucketed into min_distance-sized grid cells and only compared
+    with the 3×3 neighbouring cells, so memory stays bounded by local density
+    instead of growing as N² on noisy skeletons.
+    """
+    if len(minutiae) < 2 or not min_distance:
+        return minutiae
+    points = np.stack([minutiae["x"], minutiae["y"]], axis=1).astype(np.float32)
+    cells = np.floor(points / min_distance).astype(np.int64)
+
+    buckets = defaultdict(list)
+    for i, cell in enumerate(map(tuple, cells.tolist())):
+        buckets[cell].append(i)
+    buckets = {cell: np.array(members) for cell, members in buckets.items()}
+
+    keep = np.ones(len(points), dtype=bool)
+    for (cx, cy), members in buckets.items():
+        neighbours = np.concatenate([buckets[(cx + dx, cy + dy)] for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                                     if (cx + dx, cy + dy) in buckets])
+        distances = ((points[members, None, :] - points[None, neighbours, :]) ** 2).sum(axis=-1)
+        distances[members[:, None] == neighbours[None, :]] = np.inf
+        keep[members] = distances.min(axis=1) >= min_distance ** 2
+    return minutiae[keep]
+
+
+if __name__ == "__main__":
+    import time
+    from data_cleaner import binarize_ridge_map
+
+    image_path = "fingerprint.bmp"
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    ridge_map = binarize_ridge_map(gray)
+
+    start = time.perf_counter()
+    minutiae = extract_minutiae(ridge_map)
+    elapsed = (time.perf_counter() - start) * 1000.
+
+    endings = int((minutiae["type"] == RIDGE_ENDING).sum())
+    bifurcations = int((minutiae["type"] == BIFURCATION).sum())
+    print(f"✅ {len(minutiae)} minutiae ({endings} endings, {bifurcations} bifurcations) in {elapsed:.1f} ms")
@@ -0,0 +1,137 @@
+import cv2
+import numpy as np
+
+# 8-neighbour ring around a block, walked in a closed loop
+RING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+
+def orientation_field(img, block_size=16, smooth_sigma=1.0, min_std=20.0):
+    """Block-wise ridge orientation, coherence and foreground mask of a grayscale or binary print.
+
+    Orientation is in radians in [0, π); coherence is in [0, 1] (1 = perfectly
+    parallel ridges). Everything is computed on a (H // block_size, W // block_size)
+    grid with whole-array numpy reductions.
+    """
+    img = img.astype(np.float32)
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=3)
+
+    rows, cols = img.shape[0] // block_size, img.shape[1] // block_size
+
+    def block_sum(a):
+        return a[:rows * block_size, :cols * block_size].reshape(rows, block_size, cols, block_size).sum(axis=(1, 3))
+
+    gxx, gyy, gxy = block_sum(gx * gx), block_sum(gy * gy), block_sum(gx * gy)
+
+    # Doubled-angle vectors average correctly across the 0/π wrap-around
+    vx, vy, energy = gxx - gyy, 2 * gxy, gxx + gyy
+    if smooth_sigma:
+        vx = cv2.GaussianBlur(vx, (0, 0), smooth_sigma)
+        vy = cv2.GaussianBlur(vy, (0, 0), smooth_sigma)
+        energy = cv2.GaussianBlur(energy, (0, 0), smooth_sigma)
+
+    orientation = np.mod(0.5 * np.arctan2(vy, vx) + np.pi / 2, np.pi)
+    coherence = np.sqrt(vx ** 2 + vy ** 2) / (energy + 1e-6)
+
+    block_count = block_size * block_size
+    mean = block_sum(img) / block_count
+    std = np.sqrt(np.maximum(block_sum(img * img) / block_count - mean ** 2, 0))
+    mask = std > min_std
+
+    return orientation, coherence, mask
+
+
+def poincare_index(orientation):
+    """Poincaré index of every interior block: ≈ +π at cores, -π at deltas, ±2π at whorl centres"""
+    rows, cols = orientation.shape
+    ring = [orientation[1 + dy:rows - 1 + dy, 1 + dx:cols - 1 + dx] for dy, dx in RING_OFFSETS]
+
+    total = np.zeros((rows - 2, cols - 2), dtype=np.float32)
+    for current, following in zip(ring, ring[1:] + ring[:1]):
+        # Orientations are only defined modulo π
+        total += np.mod(following - current + np.pi / 2, np.pi) - np.pi / 2
+
+    index = np.zeros_like(orientation, dtype=np.float32)
+    index[1:-1, 1:-1] = total
+    return index
+
+
+def _singularities(mask, index):
+    """Strength in [0, 1] of each connected singular region, and how many points it counts as.
+
+    A region peaking near ±2π is a whorl centre and counts twice; strength is
+    how close the peak gets to the ideal index (π, or 2π for a whorl centre).
+    """
+    if not mask.any():
+        return [], 0
+    count, labels = cv2.connectedComponents(mask.astype(np.uint8), connectivity=8)
+    peaks = np.zeros(count, dtype=np.float32)
+    np.maximum.at(peaks, labels[mask], index[mask])
+    peaks = peaks[1:]
+    doubled = peaks > 1.5 * np.pi
+    strengths = np.minimum(peaks / np.where(doubled, 2 * np.pi, np.pi), 1.0)
+    return strengths.tolist(), int(np.where(doubled, 2, 1).sum())
+
+
+def singular_points(ridge_map, block_size=16):
+    """Cores and deltas on the foreground of a (binarized) ridge map.
+
+    Returns a dict with the ``cores`` and ``deltas`` counts, ``strength`` (the
+    weakest detection, 0 when nothing was found), ``quality`` (mean foreground
+    orientation coherence) and ``coverage`` (foreground fraction of the image).
+    """
+    orientation, coherence, mask = orientation_field(ridge_map, block_size=block_size)
+    if not mask.any():
+        return {"cores": 0, "deltas": 0, "strength": 0.0, "quality": 0.0, "coverage": 0.0}
+
+    # Ignore the print border, where the orientation field is unreliable
+    interior = cv2.erode(mask.astype(np.uint8), np.ones((3, 3), np.uint8)).astype(bool)
+    index = poincare_index(orientation)
+
+    core_strengths, cores = _singularities(interior & (index > 0.75 * np.pi), index)
+    delta_strengths, deltas = _singularities(interior & (index < -0.75 * np.pi), -index)
+    strengths = core_strengths + delta_strengths
+
+    return {
+        "cores": cores,
+        "deltas": deltas,
+        "strength": float(min(strengths)) if strengths else 0.0,
+        "quality": float(coherence[mask].mean()),
+        "coverage": float(mask.mean())
+    }
+
+
+def classify_singular_points(ridge_map, block_size=16, min_coverage=0.4):
+    """Henry-style coarse rule on singular points: one core → Loop, two cores → Whorl.
+
+    Only positive detections are trusted: "no singular points" is what a
+    partial or noisy print looks like too, so arches (and prints whose
+    foreground covers less than ``min_coverage`` of the image) get confidence 0
+    and are left to the second stage. Otherwise confidence is the weakest
+    detection strength times the ridge coherence. Tented arches (core over
+    delta) land in 'Loop' here, so keep the cascade threshold high enough for
+    the second stage to see borderline prints.
+    """
+    points = singular_points(ridge_map, block_size=block_size)
+    cores, deltas = points["cores"], points["deltas"]
+
+    if cores == 0 and deltas == 0:
+        pattern = "Arch"
+    elif cores == 1 and deltas <= 1:
+        pattern = "Loop"
+    elif cores == 2 and deltas <= 2:
+        pattern = "Whorl"
+    else:
+        pattern = None
+
+    confidence = 0.0
+    if pattern in ("Loop", "Whorl") and points["coverage"] >= min_coverage:
+        confidence = points["strength"] * points["quality"]
+
+    return {
+        "pattern": pattern,
+        "confidence": confidence,
+        "cores": cores,
+        "deltas": deltas,
+        "coverage": points["coverage"]
+    }
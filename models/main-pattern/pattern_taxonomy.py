@@ -0,0 +1,52 @@
+"""Fingerprint pattern taxonomy shared by training, inference and the desktop app.
+
+Coarse classes are what the 3-class head predicts; fine patterns are the
+subtypes operators pick in the desktop dropdown. Keep this module free of
+third-party imports so the desktop app can load it cheaply.
+"""
+
+# Sorted, i.e. the order ImageFolder assigns to the class folders main.py trains on
+COARSE_CLASSES = ['Arch', 'Loop', 'Whorl']
+
+# Fine subtype → coarse class, in fine-head output order
+FINE_PATTERN_PARENTS = {
+    "Plain Arch": "Arch",
+    "Tented Arch": "Arch",
+    "Ulnar Loop": "Loop",
+    "Radial Loop": "Loop",
+    "Plain Whorl": "Whorl",
+    "Central Pocket Loop Whorl": "Whorl",
+    "Double Loop Whorl": "Whorl",
+    "Accidental Whorl": "Whorl",
+    "Spiral Whorl": "Whorl",
+    "Composite Whorl": "Whorl",
+}
+
+FINE_PATTERNS = list(FINE_PATTERN_PARENTS)
+
+# Operator-only label: never predicted, never used as a training target
+UNCLEAR_PATTERN = "Unclear/Damaged Print"
+
+# Every label the desktop dropdown offers
+PATTERN_OPTIONS = FINE_PATTERNS + [UNCLEAR_PATTERN]
+
+FINE_TO_COARSE = [COARSE_CLASSES.index(FINE_PATTERN_PARENTS[p]) for p in FINE_PATTERNS]
+
+# Coarse index → fine indices of its subtypes
+COARSE_TO_FINE = [
+    [i for i, parent in enumerate(FINE_TO_COARSE) if parent == c]
+    for c in range(len(COARSE_CLASSES))
+]
+
+
+def safe_pattern_name(pattern):
+    """Pattern name as used in saved file and folder names"""
+    return pattern.replace("/", "_").replace("\\", "_")
+
+
+def fine_index(name):
+    """Fine-head index for a pattern or its file-safe name, or None if it is not a subtype"""
+    for i, pattern in enumerate(FINE_PATTERNS):
+        if name in (pattern, safe_pattern_name(pattern)):
+            return i
+    return None
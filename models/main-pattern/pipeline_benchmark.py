@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+from pathlib import Path
+import cv2
+import numpy as np
+import torch
+
+from data_cleaner import DatasetPreprocessor
+from inference import preprocess_image
+from swin_transformer import FingerprintSwinWithAttention
+from trainer import Trainer
+
+MODEL_DIR = Path(__file__).resolve().parent
+SAMPLE_PATHS = [MODEL_DIR / "fingerprint.bmp", MODEL_DIR / "class1_Arc_0001.png"]
+CAPTURE_ROOT = MODEL_DIR.parents[1] / "desktop" / "data"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif')
+
+
+def timed(fn, warmup=2, iterations=10):
+    """Median and p90 wall time of fn() in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.)
+    timings.sort()
+    return {
+        "median_ms": timings[len(timings) // 2],
+        "p90_ms": timings[min(int(len(timings) * 0.9), len(timings) - 1)],
+        "iterations": iterations
+    }
+
+
+def sample_scans():
+    """Bundled sample scans plus whatever the desktop capture store holds"""
+    paths = [path for path in SAMPLE_PATHS if path.exists()]
+    if CAPTURE_ROOT.exists():
+        paths += sorted(path for path in CAPTURE_ROOT.rglob("*") if path.suffix.lower() in IMAGE_EXTENSIONS)
+    return paths
+
+
+def synthetic_variants(images, seed=0):
+    """Deterministic variants of each scan: scanner-sized frame with background, rotated, upscaled and noisy"""
+    rng = np.random.default_rng(seed)
+    variants = []
+    for img in images:
+        height, width = img.shape
+        frame = np.full((max(480, height + 64), max(640, width + 64)), 235, dtype=np.uint8)
+        frame[32:32 + height, 32:32 + width] = img
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), 15, 1.0)
+        noise = rng.normal(0, 12, img.shape)
+        variants += [
+            frame,
+            cv2.warpAffine(img, rotation, (width, height), borderMode=cv2.BORDER_REPLICATE),
+            cv2.resize(img, None, fx=1.5, fy=1.5, interpolation=cv2.INTER_CUBIC),
+            np.clip(img + noise, 0, 255).astype(np.uint8)
+        ]
+    return variants
+
+
+def run_benchmarks(batch_sizes=(1, 8, 32), iterations=10, train_batch_size=8):
+    """Time every pipeline stage; returns {"environment": ..., "stages": {name: timing}}"""
+    torch.manual_seed(0)
+    stages = {}
+
+    scans = [cv2.imread(str(path), cv2.IMREAD_GRAYSCALE) for path in sample_scans()]
+    scans = [scan for scan in scans if scan is not None]
+    images = scans + synthetic_variants(scans)
+    print(f"🖼️ {len(scans)} sample scans + {len(images) - len(scans)} synthetic variants")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, img in enumerate(images):
+            paths.append(Path(tmp) / f"scan_{i:03d}.png")
+            cv2.imwrite(str(paths[-1]), img)
+
+        # Per-image stages, timed over the whole set and reported per image
+        preprocessor = DatasetPreprocessor(tmp, output_root=Path(tmp) / "preprocessed")
+        for name, fn in [
+            ("data_cleaner.preprocess_image", lambda: [preprocessor.preprocess_image(p) for p in paths]),
+            ("inference.preprocess_image", lambda: [preprocess_image(str(p)) for p in paths]),
+        ]:
+            stages[name] = _per_item(timed(fn, iterations=iterations), len(paths))
+
+        model = FingerprintSwinWithAttention(num_classes=3, freeze_base=False).eval()
+        with torch.inference_mode():
+            for batch_size in batch_sizes:
+                batch = torch.randn(batch_size, 3, 224, 224)
+                stages[f"model.forward[bs={batch_size}]"] = timed(lambda: model(batch), iterations=iterations)
+
+        # Trainer step: forward + loss + backward + AdamW on a fixed synthetic batch
+        batches = [(torch.randn(train_batch_size, 3, 224, 224), torch.randint(0, 3, (train_batch_size,)))
+                   for _ in range(2)]
+        trainer = Trainer(model.train(), batches, batches, device='cpu', output_dir=tmp)
+        try:
+            stages[f"trainer.step[bs={train_batch_size}]"] = _per_item(
+                timed(trainer.train_epoch, warmup=1, iterations=max(iterations // 2, 1)), len(batches))
+        finally:
+            # An open metrics log would keep tmp from being removed on Windows
+            trainer.close_metrics()
+
+    frame_stage = _frame_conversion_stage(images, iterations)
+    if frame_stage is not None:
+        stages["desktop.frame_to_qimage"] = frame_stage
+
+    return {"environment": environment(), "stages": stages}
+
+
+def _per_item(timing, count):
+    return {**timing, "median_ms": timing["median_ms"] / count, "p90_ms": timing["p90_ms"] / count}
+
+
+def _frame_conversion_stage(images, iterations):
+    """Same numpy → QImage → scaled preview conversion as FingerprintCaptureController (skipped without PySide6)"""
+    try:
+        from PySide6.QtCore import Qt
+        from PySide6.QtGui import QImage
+    except ImportError:
+        print("⚠️ PySide6 not installed, skipping desktop frame conversion")
+        return None
+
+    def convert():
+        for img in images:
+            h, w = img.shape
+            qimage = QImage(img.data, w, h, w, QImage.Format_Grayscale8)
+            qimage.scaled(400, 500, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    return _per_item(timed(convert, iterations=iterations), len(images))
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "torch": torch.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "threads": torch.get_num_threads(),
+        "cuda": torch.cuda.is_available()
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """Stages whose median is more than ``tolerance`` slower than the baseline, as (name, baseline, current)"""
+    regressions = []
+    for name, timing in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if reference and timing["median_ms"] > reference["median_ms"] * (1 + tolerance):
+            regressions.append((name, reference["median_ms"], timing["median_ms"]))
+    return regressions
+
+
+def print_report(results, baseline=None):
+    print("="*78)
+    print(f"{'Stage':<36}{'median (ms)':>14}{'p90 (ms)':>12}{'vs baseline':>16}")
+    print("="*78)
+    for name, timing in results["stages"].items():
+        reference = (baseline or {}).get("stages", {}).get(name)
+        change = f"{(timing['median_ms'] / reference['median_ms'] - 1) * 100:+.0f}%" if reference else "-"
+        print(f"{name:<36}{timing['median_ms']:>14.2f}{timing['p90_ms']:>12.2f}{change:>16}")
+    print("="*78)
+
+
+if __name__ == '__main__':
+
+    RESULTS_PATH = "benchmark_results.json"
+    BASELINE_PATH = "benchmark_baseline.json"
+    SAVE_AS_BASELINE = False
+    TOLERANCE = 0.2  # flag stages more than 20% slower than the baseline
+
+    results = run_benchmarks()
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=4)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != results["environment"]:
+            print("⚠️ Baseline was recorded on a different environment; comparisons are indicative only")
+
+    print_report(results, baseline)
+    print(f"📝 Results saved to {RESULTS_PATH}")
+
+    if SAVE_AS_BASELINE:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"📌 Saved as baseline: {BASELINE_PATH}")
+    elif baseline is not None:
+        regressions = compare_to_baseline(results, baseline, TOLERANCE)
+        for name, before, after in regressions:
+            print(f"❌ Regression in {name}: {before:.2f} ms → {after:.2f} ms")
+        if not regressions:
+            print("✅ No regressions against the baseline")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,163 @@
+import sys
+import time
+import json
+from contextlib import contextmanager, nullcontext
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class TrainingProfiler:
+    """Opt-in per-phase timing and peak memory for the training hot path.
+
+    Phases are wall-clock seconds summed per epoch. On CUDA every phase ends
+    with a synchronize so kernel time is charged to the phase that launched it.
+    When ``trace_steps`` is set, that many steps of the first epoch (after
+    ``trace_wait`` warm-up steps) are also recorded with ``torch.profiler`` and
+    exported as a Chrome trace into the run folder.
+    """
+    def __init__(self, run_folder, device='cpu', enabled=True, trace_steps=None, trace_wait=5):
+        self.run_folder = run_folder
+        self.device = device
+        self.enabled = enabled
+        self.trace_steps = trace_steps
+        self.trace_wait = trace_wait
+        self.summary_path = run_folder / "profile_summary.json"
+        self.trace_path = run_folder / "profile_trace.json"
+
+        self.is_cuda = str(device).startswith('cuda')
+        self.epochs = []
+        self._timings = {}
+        self._steps = 0
+        self._samples = 0
+        self._epoch = None
+        self._epoch_start = None
+        self._torch_profiler = None
+        self._traced = False
+
+    def start_epoch(self, epoch):
+        if not self.enabled:
+            return
+        self._epoch = epoch
+        self._timings = {}
+        self._steps = 0
+        self._samples = 0
+        if self.is_cuda:
+            torch.cuda.reset_peak_memory_stats()
+
+        if self.trace_steps and not self._traced:
+            self._torch_profiler = torch.profiler.profile(
+                activities=self._trace_activities(),
+                schedule=torch.profiler.schedule(wait=self.trace_wait, warmup=1, active=self.trace_steps, repeat=1),
+                on_trace_ready=self._export_trace,
+                record_shapes=True,
+                profile_memory=True
+            )
+            self._torch_profiler.start()
+        self._epoch_start = time.perf_counter()
+
+    def iter_batches(self, loader):
+        """Yield from the loader, charging the time spent waiting to 'data_wait'"""
+        if not self.enabled:
+            yield from loader
+            return
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self._add("data_wait", time.perf_counter() - start)
+            yield batch
+
+    def phase(self, name):
+        """Context manager timing one phase of the current step"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.is_cuda:
+                torch.cuda.synchronize()
+            self._add(name, time.perf_counter() - start)
+
+    def step(self, batch_size):
+        if not self.enabled:
+            return
+        self._steps += 1
+        self._samples += batch_size
+        if self._torch_profiler is not None:
+            self._torch_profiler.step()
+
+    def end_epoch(self):
+        if not self.enabled:
+            return None
+        epoch_time = time.perf_counter() - self._epoch_start
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+            self._torch_profiler = None
+            self._traced = True
+
+        timed = sum(self._timings.values())
+        phases = {
+            name: {
+                "total_s": total,
+                "mean_ms": 1000. * total / max(self._steps, 1),
+                "share": total / epoch_time if epoch_time else 0.0
+            }
+            for name, total in sorted(self._timings.items(), key=lambda item: -item[1])
+        }
+        summary = {
+            "epoch": self._epoch,
+            "steps": self._steps,
+            "samples": self._samples,
+            "epoch_time_s": epoch_time,
+            "untimed_s": max(epoch_time - timed, 0.0),
+            "samples_per_s": self._samples / epoch_time if epoch_time else 0.0,
+            "phases": phases,
+            "peak_memory_mb": self._peak_memory_mb()
+        }
+        self.epochs.append(summary)
+        return summary
+
+    def save(self):
+        if not self.enabled:
+            return
+        with open(self.summary_path, 'w') as f:
+            json.dump({"device": str(self.device), "epochs": self.epochs}, f, indent=4)
+
+    def format_summary(self, summary):
+        parts = [f"{name} {stats['mean_ms']:.1f}ms" for name, stats in summary["phases"].items()]
+        return f"⏱️ {summary['samples_per_s']:.1f} samples/s | " + ", ".join(parts)
+
+    def _add(self, name, seconds):
+        self._timings[name] = self._timings.get(name, 0.0) + seconds
+
+    def _peak_memory_mb(self):
+        if self.is_cuda:
+            return {"cuda_allocated": torch.cuda.max_memory_allocated() / 2 ** 20}
+        if resource is None:
+            return None
+        # ru_maxrss is the process high-water mark: KiB on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+        return {"host_rss": max_rss / scale}
+
+    def _trace_activities(self):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.is_cuda:
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        return activities
+
+    def _export_trace(self, prof):
+        prof.export_chrome_trace(str(self.trace_path))
+        print(f"🧭 Profiler trace saved at: {self.trace_path}")
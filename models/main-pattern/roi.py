@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+
+def block_std(img, block_size=16):
+    """Standard deviation of every block_size × block_size block, from one integral image"""
+    rows, cols = img.shape[0] // block_size, img.shape[1] // block_size
+    total, squared = cv2.integral2(img[:rows * block_size, :cols * block_size], sdepth=cv2.CV_64F)
+
+    def block_sum(integral):
+        corners = integral[::block_size, ::block_size]
+        return corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+    count = block_size * block_size
+    mean = block_sum(total) / count
+    return np.sqrt(np.maximum(block_sum(squared) / count - mean ** 2, 0))
+
+
+def foreground_bbox(img, block_size=16, min_std=20.0, margin_blocks=1, square=True):
+    """(x0, y0, x1, y1) bounding box of the print in a grayscale array, or None if no ridges are found.
+
+    Blocks whose intensity varies more than ``min_std`` are foreground; an
+    opening drops isolated noisy blocks. With ``square`` the box is grown to a
+    square (as far as the frame allows) so the 224×224 resize keeps the
+    print's aspect ratio. Images smaller than one block are returned whole.
+    """
+    height, width = img.shape[:2]
+    if height < block_size or width < block_size:
+        # Too small for a single block: treat the whole image as the print
+        return 0, 0, width, height
+
+    mask = (block_std(img, block_size) > min_std).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    ys, xs = np.nonzero(mask)
+    if not len(ys):
+        return None
+
+    x0 = max((xs.min() - margin_blocks) * block_size, 0)
+    y0 = max((ys.min() - margin_blocks) * block_size, 0)
+    x1 = min((xs.max() + 1 + margin_blocks) * block_size, width)
+    y1 = min((ys.max() + 1 + margin_blocks) * block_size, height)
+
+    if square:
+        # Grow the short side towards the long one, never cutting into the print
+        side = max(x1 - x0, y1 - y0)
+        box_w, box_h = min(side, width), min(side, height)
+        x0 = int(np.clip((x0 + x1 - box_w) // 2, 0, width - box_w))
+        y0 = int(np.clip((y0 + y1 - box_h) // 2, 0, height - box_h))
+        x1, y1 = x0 + box_w, y0 + box_h
+    return int(x0), int(y0), int(x1), int(y1)
+
+
+def crop_to_roi(img, **kwargs):
+    """Crop a grayscale array to its foreground_bbox (unchanged when no print is found)"""
+    bbox = foreground_bbox(img, **kwargs)
+    if bbox is None:
+        return img
+    x0, y0, x1, y1 = bbox
+    return img[y0:y1, x0:x1]
+
+
+class CropToROI:
+    """torchvision-style transform: crop a PIL image to the print before resizing"""
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def __call__(self, image):
+        bbox = foreground_bbox(np.asarray(image.convert('L')), **self.kwargs)
+        return image if bbox is None else image.crop(bbox)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+from pattern_taxonomy import COARSE_CLASSES, FINE_PATTERNS, FINE_PATTERN_PARENTS, fine_index
+
+SPLITS = ("train", "val", "test")
+MANIFEST_FIELDS = ("path", "coarse", "fine", "patient_uuid", "finger")
+
+
+def iter_patient_records(data_root):
+    """Yield (patient_dir, record) for every data/<uuid>/patient.json, one file at a time"""
+    with os.scandir(data_root) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_dir())
+    for name in names:
+        record_path = Path(data_root) / name / "patient.json"
+        if not record_path.exists():
+            continue
+        try:
+            with open(record_path) as f:
+                yield record_path.parent, json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Skipping unreadable record {record_path}: {e}")
+
+
+def patient_rows(patient_dir, record):
+    """Manifest rows for the labelled, existing captures of one patient (unclear prints are dropped)"""
+    rows = []
+    for entry in record.get("fingerprints", []):
+        index = fine_index(entry.get("pattern", ""))
+        image_path = patient_dir / entry.get("file", "")
+        if index is None or not image_path.is_file():
+            continue
+        fine = FINE_PATTERNS[index]
+        rows.append({
+            "path": str(image_path.resolve()),
+            "coarse": FINE_PATTERN_PARENTS[fine],
+            "fine": fine,
+            "patient_uuid": record.get("uuid", patient_dir.name),
+            "finger": entry.get("finger", "")
+        })
+    return rows
+
+
+class PatientSplitter:
+    """Streaming, patient-grouped split of the desktop capture store.
+
+    Every patient goes wholly into one split, chosen on arrival as the split
+    whose per-pattern counts are furthest below their target share of
+    everything seen so far. One pass keeps each pattern close to the requested
+    ratios without ever holding the whole store in memory.
+    """
+    def __init__(self, ratios=(0.7, 0.15, 0.15), stratify_by="coarse"):
+        self.ratios = ratios
+        self.stratify_by = stratify_by
+        self.seen = {}
+        self.assigned = [{} for _ in SPLITS]
+
+    def assign(self, rows):
+        """Index of the split for one patient's rows"""
+        counts = {}
+        for row in rows:
+            counts[row[self.stratify_by]] = counts.get(row[self.stratify_by], 0) + 1
+
+        def deficit(split):
+            return sum(
+                count * (self.ratios[split] * (self.seen.get(label, 0) + count) - self.assigned[split].get(label, 0))
+                for label, count in counts.items()
+            )
+
+        split = max(range(len(SPLITS)), key=lambda s: (deficit(s), self.ratios[s]))
+        for label, count in counts.items():
+            self.seen[label] = self.seen.get(label, 0) + count
+            self.assigned[split][label] = self.assigned[split].get(label, 0) + count
+        return split
+
+
+def build_split_manifests(data_root, output_root="split_manifests", ratios=(0.7, 0.15, 0.15),
+                          stratify_by="coarse", link_root=None):
+    """Write <output_root>/{train,val,test}.csv from the capture store in a single pass.
+
+    With ``link_root``, also hard-link each capture into
+    <link_root>/{train,val,test}_set/<coarse>/ so ``datasets.ImageFolder`` in
+    main.py can read the split without copying a byte.
+    """
+    output_root = Path(output_root)
+    output_root.mkdir(parents=True, exist_ok=True)
+    splitter = PatientSplitter(ratios, stratify_by=stratify_by)
+
+    files = [open(output_root / f"{name}.csv", "w", newline="") for name in SPLITS]
+    writers = [csv.DictWriter(f, fieldnames=MANIFEST_FIELDS) for f in files]
+    for writer in writers:
+        writer.writeheader()
+
+    patients = [0] * len(SPLITS)
+    images = [0] * len(SPLITS)
+    try:
+        for patient_dir, record in iter_patient_records(data_root):
+            rows = patient_rows(patient_dir, record)
+            if not rows:
+                continue
+            split = splitter.assign(rows)
+            writers[split].writerows(rows)
+            patients[split] += 1
+            images[split] += len(rows)
+
+            if link_root is not None:
+                for row in rows:
+                    _link(Path(row["path"]), Path(link_root) / f"{SPLITS[split]}_set" / row["coarse"],
+                          row["patient_uuid"])
+    finally:
+        for f in files:
+            f.close()
+
+    for name, patient_count, image_count in zip(SPLITS, patients, images):
+        print(f"📂 {name}: {patient_count} patients, {image_count} images")
+    print(f"✅ Split manifests saved to: {output_root.resolve()}")
+    return dict(zip(SPLITS, images))
+
+
+def _link(source, folder, patient_uuid):
+    # Capture file names repeat across patients, so prefix the uuid
+    folder.mkdir(parents=True, exist_ok=True)
+    destination = folder / f"{patient_uuid}_{source.name}"
+    if not destination.exists():
+        try:
+            os.link(source, destination)
+        except OSError:
+            # Cross-device, or a filesystem without hard links
+            shutil.copy2(source, destination)
+
+
+class ManifestDataset(Dataset):
+    """ImageFolder-style dataset over one split manifest.
+
+    Coarse labels index COARSE_CLASSES (the same order ImageFolder gives the
+    class folders); fine labels follow the fine-head order. Manifests point at
+    raw captures, so pass ``preprocess=DatasetPreprocessor(...).preprocess_array``
+    to train on the same binarized ridge maps as preprocessed_data.
+    """
+    def __init__(self, manifest_path, transform=None, label="coarse", preprocess=None):
+        with open(manifest_path, newline="") as f:
+            self.rows = list(csv.DictReader(f))
+        self.transform = transform
+        self.preprocess = preprocess
+        self.label = label
+        self.classes = list(COARSE_CLASSES) if label == "coarse" else list(FINE_PATTERNS)
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.targets = [self.class_to_idx[row[label]] for row in self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        image = Image.open(self.rows[idx]["path"])
+        if self.preprocess is not None:
+            image = Image.fromarray(self.preprocess(np.asarray(image.convert("L"))))
+        image = image.convert("RGB")
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[idx]
+
+
+if __name__ == "__main__":
+    data_root = os.path.join("..", "..", "desktop", "data")
+    build_split_manifests(data_root, "split_manifests", link_root=None)
@@ -0,0 +1,42 @@
+import torch
+import torch.nn as nn
+from torchvision.models import mobilenet_v3_small, MobileNet_V3_Small_Weights
+
+class FingerprintStudentCNN(nn.Module):
+    """MobileNetV3-small student (~1.5M params) for single-channel fingerprint images"""
+    def __init__(self, num_classes=3, pretrained=True):
+        super().__init__()
+
+        weights = MobileNet_V3_Small_Weights.IMAGENET1K_V1 if pretrained else None
+        self.backbone = mobilenet_v3_small(weights=weights)
+
+        # Grayscale stem: summing the RGB filters keeps the pretrained response to gray inputs
+        stem = self.backbone.features[0][0]
+        gray_stem = nn.Conv2d(1, stem.out_channels, kernel_size=stem.kernel_size,
+                              stride=stem.stride, padding=stem.padding, bias=False)
+        with torch.no_grad():
+            gray_stem.weight.copy_(stem.weight.sum(dim=1, keepdim=True))
+        self.backbone.features[0][0] = gray_stem
+
+        in_features = self.backbone.classifier[-1].in_features
+        self.backbone.classifier[-1] = nn.Linear(in_features, num_classes)
+
+    def forward(self, x):
+        return self.backbone(x)
+
+
+class GrayscaleTeacher(nn.Module):
+    """Feeds single-channel student batches to an RGB teacher exactly as ImageFolder would have"""
+    def __init__(self, teacher, gray_mean=0.5, gray_std=0.5,
+                 rgb_mean=(0.485, 0.456, 0.406), rgb_std=(0.229, 0.224, 0.225)):
+        super().__init__()
+        self.teacher = teacher
+        self.gray_mean = gray_mean
+        self.gray_std = gray_std
+        self.register_buffer("rgb_mean", torch.tensor(rgb_mean).view(1, 3, 1, 1))
+        self.register_buffer("rgb_std", torch.tensor(rgb_std).view(1, 3, 1, 1))
+
+    def forward(self, x):
+        pixels = x * self.gray_std + self.gray_mean
+        rgb = (pixels.expand(-1, 3, -1, -1) - self.rgb_mean) / self.rgb_std
+        return self.teacher(rgb)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import random
+import statistics
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+import torch
+from torchvision import transforms, datasets
+from torch.utils.data import DataLoader, Subset
+from swin_transformer import FingerprintSwinWithAttention
+from trainer import Trainer
+
+# Trainer defaults (the values main.py trains with)
+DEFAULT_CONFIG = {
+    "lr": 1e-4,
+    "batch_size": 16,
+    "epochs": 20,
+    "lr_step_size": 10,
+    "lr_gamma": 0.5,
+    "weight_decay": 0.01,
+    "train_fraction": 1.0,
+}
+
+TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+
+class TrialPruned(Exception):
+    pass
+
+
+class MedianPruner:
+    """Stops a trial whose val_acc falls below the median of the other trials at the same epoch.
+
+    Reports live in a multiprocessing.Manager dict shared by every worker, so
+    trials running side by side prune each other as soon as enough of them
+    have reached an epoch.
+    """
+    def __init__(self, reports, lock, warmup_epochs=2, min_trials=3):
+        self.reports = reports
+        self.lock = lock
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+
+    def should_prune(self, epoch, val_acc):
+        with self.lock:
+            others = list(self.reports.get(epoch, []))
+            self.reports[epoch] = others + [val_acc]
+        if epoch < self.warmup_epochs or len(others) < self.min_trials - 1:
+            return False
+        return val_acc < statistics.median(others)
+
+
+class SweepTrainer(Trainer):
+    """Trainer that reports every validation accuracy to a pruner"""
+    def __init__(self, *args, pruner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pruner = pruner
+        self.epochs_run = 0
+        self.best_val_acc_so_far = 0.0
+
+    def validate_epoch(self):
+        val_loss, val_acc = super().validate_epoch()
+        self.epochs_run += 1
+        self.best_val_acc_so_far = max(self.best_val_acc_so_far, val_acc)
+        if self.pruner is not None and self.pruner.should_prune(self.epochs_run, val_acc):
+            raise TrialPruned(f"val_acc {val_acc:.2f}% below the median at epoch {self.epochs_run}")
+        return val_loss, val_acc
+
+
+def sample_configs(space, n_trials=None, seed=42):
+    """Configs from a {param: [values]} space: the full grid, or n_trials distinct random draws from it"""
+    keys = sorted(space)
+    combos = list(itertools.product(*(space[key] for key in keys)))
+    if n_trials is not None and n_trials < len(combos):
+        combos = random.Random(seed).sample(combos, n_trials)
+    return [{**DEFAULT_CONFIG, **dict(zip(keys, combo))} for combo in combos]
+
+
+def _pin_worker(core_slots):
+    """Worker initializer: claim one slice of cores and keep torch's thread pool inside it"""
+    cores = core_slots.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def run_trial(trial_id, config, data_root, trial_root, reports, lock, pruning, train_order=None):
+    """Train one config in its own folder; returns a result dict (never raises).
+
+    ``train_order`` is the sweep-wide shuffled index order of the training set;
+    a trial with train_fraction < 1 trains on its first images, so trials with
+    the same fraction see the same data and the pruner compares like with like.
+    """
+    trial_dir = Path(trial_root) / f"trial_{trial_id:03d}"
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    torch.manual_seed(trial_id)
+
+    result = {"trial": trial_id, "config": config, "status": "complete", "best_val_acc": 0.0, "epochs_run": 0}
+    start = time.perf_counter()
+    try:
+        train_set = datasets.ImageFolder(os.path.join(data_root, "train_set"), transform=TRANSFORM)
+        val_set = datasets.ImageFolder(os.path.join(data_root, "val_set"), transform=TRANSFORM)
+        if config["train_fraction"] < 1.0:
+            order = train_order if train_order is not None else list(range(len(train_set)))
+            train_set = Subset(train_set, order[:max(1, int(len(train_set) * config["train_fraction"]))])
+
+        train_loader = DataLoader(train_set, batch_size=config["batch_size"], shuffle=True, num_workers=0)
+        val_loader = DataLoader(val_set, batch_size=config["batch_size"], shuffle=False, num_workers=0)
+
+        model = FingerprintSwinWithAttention(num_classes=len(val_set.classes), freeze_base=False)
+        pruner = MedianPruner(reports, lock, **pruning) if pruning is not None else None
+        trainer = SweepTrainer(model, train_loader, val_loader, device='cpu', lr=config["lr"],
+                               weight_decay=config["weight_decay"], lr_step_size=config["lr_step_size"],
+                               lr_gamma=config["lr_gamma"], output_dir=trial_dir, pruner=pruner)
+        try:
+            trainer.fit(epochs=config["epochs"])
+        except TrialPruned as e:
+            result["status"] = "pruned"
+            result["reason"] = str(e)
+        result["best_val_acc"] = trainer.best_val_acc_so_far
+        result["epochs_run"] = trainer.epochs_run
+        result["run_folder"] = str(trainer.run_folder)
+    except Exception as e:
+        result["status"] = "failed"
+        result["reason"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_sweep(configs, data_root, output_root="sweeps", parallel_trials=None, cores_per_trial=None,
+              pruning=None, subset_seed=0):
+    """Run every config as a trial in parallel processes pinned to disjoint cores; returns ranked results.
+
+    ``pruning`` holds MedianPruner options (``{}`` for defaults, None to train
+    every trial to completion). Trials with train_fraction < 1 all train on
+    subsets of one ``subset_seed`` shuffle. Results are ranked by best val_acc
+    and written to <output_root>/<sweep id>/sweep_summary.json.
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    parallel_trials = parallel_trials or max(1, len(available) // (cores_per_trial or 2))
+    cores_per_trial = cores_per_trial or max(1, len(available) // parallel_trials)
+    sweep_dir = Path(output_root).resolve() / datetime.now().strftime("%Y%m%d_%H%M%S")
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    data_root = str(Path(data_root).resolve())
+
+    # One shuffled training order for the whole sweep (fixed seed), so reduced-data trials share their subset
+    train_size = len(datasets.ImageFolder(os.path.join(data_root, "train_set")).samples)
+    train_order = torch.randperm(train_size, generator=torch.Generator().manual_seed(subset_seed)).tolist()
+
+    print(f"🔬 {len(configs)} trials, {parallel_trials} in parallel × {cores_per_trial} cores → {sweep_dir}")
+
+    context = mp.get_context("spawn")
+    with context.Manager() as manager:
+        core_slots = manager.Queue()
+        for i in range(parallel_trials):
+            core_slots.put(set(available[(i * cores_per_trial + j) % len(available)] for j in range(cores_per_trial)))
+        reports, lock = manager.dict(), manager.Lock()
+
+        results = []
+        with ProcessPoolExecutor(max_workers=parallel_trials, mp_context=context,
+                                 initializer=_pin_worker, initargs=(core_slots,)) as pool:
+            futures = [pool.submit(run_trial, i, config, data_root, sweep_dir, reports, lock, pruning, train_order)
+                       for i, config in enumerate(configs)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"  trial {result['trial']:03d} {result['status']:<8} best val_acc {result['best_val_acc']:.2f}% "
+                      f"after {result['epochs_run']} epochs ({result['seconds']:.0f}s)")
+
+    results.sort(key=lambda r: (r["status"] == "complete", r["best_val_acc"]), reverse=True)
+    with open(sweep_dir / "sweep_summary.json", "w") as f:
+        json.dump({"results": results}, f, indent=4)
+    return results
+
+
+def print_summary(results, top=10):
+    print("\n" + "="*96)
+    print(f"{'Rank':<6}{'Trial':<7}{'Status':<10}{'Val Acc':>9}{'Epochs':>8}  Config")
+    print("="*96)
+    for rank, result in enumerate(results[:top], 1):
+        config = ", ".join(f"{key}={value}" for key, value in result["config"].items() if DEFAULT_CONFIG.get(key) != value)
+        print(f"{rank:<6}{result['trial']:<7}{result['status']:<10}{result['best_val_acc']:>8.2f}%"
+              f"{result['epochs_run']:>8}  {config or 'defaults'}")
+    print("="*96)
+
+
+if __name__ == '__main__':
+
+    DATA_ROOT = "preprocessed_data"
+    SEARCH_SPACE = {
+        "lr": [3e-5, 1e-4, 3e-4],
+        "batch_size": [16, 32],
+        "lr_step_size": [3, 5],
+        "lr_gamma": [0.5, 0.1],
+        "weight_decay": [0.01, 0.05],
+        "epochs": [6],
+        "train_fraction": [0.5],
+    }
+    N_TRIALS = 12
+
+    configs = sample_configs(SEARCH_SPACE, n_trials=N_TRIALS)
+    results = run_sweep(configs, DATA_ROOT, pruning={"warmup_epochs": 2, "min_trials": 3})
+    print_summary(results)
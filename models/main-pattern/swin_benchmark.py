@@ -0,0 +1,51 @@
+import time
+import copy
+import torch
+from swin_transformer import FingerprintSwinWithAttention, optimize_for_inference
+
+
+def measure_latency(model, batch_size, warmup=3, iterations=10, device='cpu', channels=3):
+    """Median forward latency in milliseconds for one batch of 224×224 inputs"""
+    images = torch.randn(batch_size, channels, 224, 224, device=device)
+    timings = []
+    with torch.inference_mode():
+        for _ in range(warmup):
+            model(images)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(images)
+            timings.append((time.perf_counter() - start) * 1000.)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def max_abs_difference(reference, candidate, batch_size=4):
+    images = torch.randn(batch_size, 3, 224, 224)
+    with torch.inference_mode():
+        return (reference(images) - candidate(images)).abs().max().item()
+
+
+if __name__ == '__main__':
+
+    BATCH_SIZES = [1, 32]
+    torch.manual_seed(0)
+
+    reference = FingerprintSwinWithAttention(num_classes=3, freeze_base=False).eval()
+    variants = {
+        "reference": reference,
+        "fused": optimize_for_inference(copy.deepcopy(reference), channels_last=False),
+        "fused+channels_last": optimize_for_inference(copy.deepcopy(reference), channels_last=True),
+    }
+    if hasattr(torch, "compile"):
+        variants["fused+channels_last+compile"] = optimize_for_inference(
+            copy.deepcopy(reference), channels_last=True, compile=True)
+
+    print(f"🧵 CPU threads: {torch.get_num_threads()}")
+    print("="*72)
+    print(f"{'Variant':<30}{'max |Δ logits|':>16}" + "".join(f"{f'bs={b} (ms)':>13}" for b in BATCH_SIZES))
+    print("="*72)
+    for name, model in variants.items():
+        diff = max_abs_difference(reference, model)
+        latencies = [measure_latency(model, b) for b in BATCH_SIZES]
+        print(f"{name:<30}{diff:>16.2e}" + "".join(f"{latency:>13.1f}" for latency in latencies))
+    print("="*72)
@@ -1,6 +1,8 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torchvision.models.swin_transformer import swin_t, Swin_T_Weights
+from pattern_taxonomy import FINE_TO_COARSE
 
 class SEBlock(nn.Module):
     """Squeeze-and-Excitation attention block"""
@@ -20,10 +22,25 @@ class SEBlock(nn.Module):
         scale = self.fc(scale).view(B, C, 1, 1)
         return x * scale
 
+    def forward_pooled(self, pooled):
+        """SE-scaled global average from the already pooled (B, C) features.
+
+        mean(x * s) == s * mean(x) because s is constant over the spatial
+        dimensions, so the scaled feature map never has to be materialized.
+        """
+        return pooled * self.fc(pooled)
+
 class FingerprintSwinWithAttention(nn.Module):
-    def __init__(self, num_classes=3, freeze_base=True):
+    def __init__(self, num_classes=3, freeze_base=True, fused=False, num_fine_classes=0):
         super().__init__()
         
+        self.num_classes = num_classes
+        self.num_fine_classes = num_fine_classes
+        
+        # Fused mode: pool NHWC features directly and fold SE scaling into the mean
+        self.fused = fused
+        self.channels_last = False
+        
 
         self.backbone = swin_t(weights=Swin_T_Weights.IMAGENET1K_V1)
         
@@ -45,10 +62,76 @@ class FingerprintSwinWithAttention(nn.Module):
             nn.Linear(256, num_classes)
         )
         
+        # Optional hierarchical head: fine subtypes (see pattern_taxonomy) on the same pooled features
+        self.fine_classifier = None
+        if num_fine_classes:
+            self.fine_classifier = nn.Sequential(
+                nn.Linear(feature_dim, 256),
+                nn.ReLU(inplace=True),
+                nn.Dropout(0.3),
+                nn.Linear(256, num_fine_classes)
+            )
+        
     def forward(self, x):
+        features = self.forward_features(x)
+        output = self.classifier(features)        
+        if self.fine_classifier is not None:
+            # Hierarchical models return [coarse logits | fine logits]
+            output = torch.cat([output, self.fine_classifier(features)], dim=1)
+        return output
+
+    def forward_hierarchical(self, x, fine_threshold=0.0):
+        """Coarse probabilities for every image, fine-subtype probabilities only where they are warranted.
+
+        The fine head runs just for images whose coarse confidence reaches
+        ``fine_threshold`` and is restricted to subtypes of the predicted
+        coarse class. Returns ``(coarse_probs, fine_probs, gate)``; rows of
+        ``fine_probs`` outside ``gate`` are zero.
+        """
+        features = self.forward_features(x)
+        coarse_probs = F.softmax(self.classifier(features), dim=1)
+        confidence, coarse_pred = coarse_probs.max(1)
+
+        gate = confidence >= fine_threshold
+        fine_probs = coarse_probs.new_zeros(x.size(0), self.num_fine_classes)
+        if self.fine_classifier is not None and gate.any():
+            fine_logits = constrain_fine_logits(coarse_pred[gate], self.fine_classifier(features[gate]))
+            fine_probs[gate] = F.softmax(fine_logits, dim=1)
+        return coarse_probs, fine_probs, gate
+
+    def forward_features(self, x):
+        """SE-weighted, globally pooled backbone features of shape (B, 768)"""
+        if self.fused:
+            return self._forward_features_fused(x)
         features = self.backbone.features(x) 
         features = features.permute(0, 3, 1, 2)
         features = self.attention(features)
         features = torch.mean(features, dim=[2, 3])    
-        output = self.classifier(features)        
-        return output
+        return features
+
+    def _forward_features_fused(self, x):
+        if self.channels_last:
+            # Patch-embedding conv then writes NHWC directly, so its Permute is free
+            x = x.contiguous(memory_format=torch.channels_last)
+        features = self.backbone.features(x)           # (B, H, W, C)
+        pooled = features.mean(dim=(1, 2))             # no permute copy
+        return self.attention.forward_pooled(pooled)
+
+
+def constrain_fine_logits(coarse_pred, fine_logits):
+    """Mask fine logits that do not belong to each row's predicted coarse class"""
+    fine_to_coarse = torch.tensor(FINE_TO_COARSE, device=fine_logits.device)
+    allowed = fine_to_coarse.unsqueeze(0) == coarse_pred.unsqueeze(1)
+    return fine_logits.masked_fill(~allowed, float('-inf'))
+
+
+def optimize_for_inference(model, channels_last=True, compile=False):
+    """Switch an eval-mode model to the fused forward, optionally channels-last and torch.compile'd"""
+    model.eval()
+    model.fused = True
+    model.channels_last = channels_last
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if compile:
+        model = torch.compile(model)
+    return model
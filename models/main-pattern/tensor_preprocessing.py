@@ -0,0 +1,230 @@
+import math
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from collections import defaultdict
+from torchvision import transforms
+from torchvision.transforms import functional as TF
+from roi import CropToROI
+
+# Raw captures for on-the-fly preprocessing: grayscale uint8, cropped to the print, at native resolution.
+# Like the offline data_cleaner path, binarization runs before the resize (in BatchRidgePreprocessor).
+RAW_TRANSFORM = transforms.Compose([
+    CropToROI(),
+    transforms.Grayscale(),
+    transforms.PILToTensor()
+])
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def gaussian_kernel(ksize, sigma=0):
+    """1-D Gaussian kernel with OpenCV's defaults (fixed [1/4, 1/2, 1/4] for ksize 3, derived sigma otherwise)"""
+    if ksize == 3 and sigma <= 0:
+        return torch.tensor([0.25, 0.5, 0.25])
+    if sigma <= 0:
+        sigma = 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+    x = torch.arange(ksize, dtype=torch.float32) - (ksize - 1) / 2
+    kernel = torch.exp(-x ** 2 / (2 * sigma ** 2))
+    return kernel / kernel.sum()
+
+
+def gaussian_blur(images, kernel, padding_mode='reflect'):
+    """Separable blur of (N, 1, H, W) images, rounded back to integer intensities like an 8-bit OpenCV blur"""
+    radius = len(kernel) // 2
+    height, width = images.shape[-2:]
+    padded = F.pad(images, (radius, radius, radius, radius), mode=padding_mode)
+    # Shifted weighted sums: single-channel conv2d is far slower than this on CPU
+    rows = sum(weight * padded[..., i:i + width] for i, weight in enumerate(kernel.tolist()))
+    blurred = sum(weight * rows[..., i:i + height, :] for i, weight in enumerate(kernel.tolist()))
+    return blurred.round()
+
+
+def clahe(images, clip_limit=2.0, tile_grid=8):
+    """Contrast-limited adaptive histogram equalization of (N, 1, H, W) 0–255 images, as cv2.createCLAHE does it.
+
+    Per-tile histograms are clipped, the excess redistributed, turned into
+    lookup tables, and every pixel bilinearly interpolates the tables of its
+    four nearest tiles — all as batched tensor ops.
+    """
+    n, _, height, width = images.shape
+    pad_h, pad_w = -height % tile_grid, -width % tile_grid
+    padded = F.pad(images, (0, pad_w, 0, pad_h), mode='reflect') if pad_h or pad_w else images
+    tile_h, tile_w = (height + pad_h) // tile_grid, (width + pad_w) // tile_grid
+    tile_area = tile_h * tile_w
+
+    tiles = padded.long().view(n, tile_grid, tile_h, tile_grid, tile_w).permute(0, 1, 3, 2, 4)
+    tiles = tiles.reshape(n, tile_grid * tile_grid, tile_area)
+    hist = torch.zeros(n, tile_grid * tile_grid, 256, dtype=torch.long, device=images.device)
+    hist.scatter_add_(2, tiles, torch.ones_like(tiles))
+
+    limit = max(int(clip_limit * tile_area / 256), 1)
+    excess = (hist - limit).clamp(min=0).sum(dim=2, keepdim=True)
+    hist = hist.clamp(max=limit) + excess // 256
+    residual = excess % 256
+    step = (256 // residual.clamp(min=1)).clamp(min=1)
+    bins = torch.arange(256, device=images.device)
+    hist += ((bins % step == 0) & (bins // step < residual)).long()
+
+    lut = (hist.cumsum(dim=2).float() * (255. / tile_area)).round().clamp(0, 255)
+    lut = lut.view(n, -1)
+
+    def tile_coords(size, tile_size):
+        coords = torch.arange(size, dtype=torch.float32, device=images.device) / tile_size - 0.5
+        first = coords.floor()
+        weight = coords - first
+        first = first.long()
+        return first.clamp(min=0), (first + 1).clamp(max=tile_grid - 1), weight
+
+    ty1, ty2, ya = tile_coords(height, tile_h)
+    tx1, tx2, xa = tile_coords(width, tile_w)
+    # LUT offsets of the four neighbouring tiles of every pixel, gathered in one call
+    corners = torch.stack([(ty[:, None] * tile_grid + tx[None, :]) * 256
+                           for ty in (ty1, ty2) for tx in (tx1, tx2)])
+    index = corners.unsqueeze(0) + images.long().view(n, 1, height, width)
+    top_left, top_right, bottom_left, bottom_right = lut.gather(1, index.view(n, -1)).view(n, 4, height, width).unbind(1)
+
+    xa, ya = xa[None, None, :], ya[None, :, None]
+    top = top_left + (top_right - top_left) * xa
+    bottom = bottom_left + (bottom_right - bottom_left) * xa
+    return (top + (bottom - top) * ya).round().clamp(0, 255).unsqueeze(1)
+
+
+def _window_max(padded):
+    """2×2 sliding maximum of a top/left padded batch (cheaper than max_pool2d for one channel)"""
+    return torch.maximum(torch.maximum(padded[..., :-1, :-1], padded[..., :-1, 1:]),
+                         torch.maximum(padded[..., 1:, :-1], padded[..., 1:, 1:]))
+
+
+class RidgeMapBinarizer(nn.Module):
+    """Batched tensor version of data_cleaner.binarize_ridge_map.
+
+    CLAHE → 3×3 blur → adaptive Gaussian threshold (inverted) → 2×2 closing →
+    3×3 blur → re-threshold, on (N, 1, H, W) or (N, H, W) 0–255 images.
+    Returns float white-ridge maps with values 0/255. Every stage mirrors
+    OpenCV's defaults (border modes, kernel anchors, rounding), so parameters
+    can be swept on the fly instead of regenerating preprocessed_data.
+    """
+    def __init__(self, clip_limit=2.0, tile_grid=8, block_size=11, c=2):
+        super().__init__()
+        self.clip_limit = clip_limit
+        self.tile_grid = tile_grid
+        self.block_size = block_size
+        self.c = c
+
+    def forward(self, images):
+        if images.dim() == 3:
+            images = images.unsqueeze(1)
+        images = images.float()
+        # Kernels are tiny; building them per call keeps the parameters freely sweepable
+        smooth_kernel = gaussian_kernel(3).to(images.device)
+        threshold_kernel = gaussian_kernel(self.block_size).to(images.device)
+
+        enhanced = clahe(images, self.clip_limit, self.tile_grid)
+        blurred = gaussian_blur(enhanced, smooth_kernel)
+
+        # cv2.adaptiveThreshold: rounded Gaussian mean with replicated borders, THRESH_BINARY_INV
+        mean = gaussian_blur(blurred, threshold_kernel, padding_mode='replicate')
+        binary = torch.where(blurred - mean <= -math.floor(self.c), 255., 0.)
+
+        # 2×2 closing with OpenCV's (1, 1) anchor: both passes look one pixel up and left
+        dilated = _window_max(F.pad(binary, (1, 0, 1, 0), value=0.))
+        closed = -_window_max(F.pad(-dilated, (1, 0, 1, 0), value=-255.))
+
+        smoothed = gaussian_blur(closed, smooth_kernel)
+        return torch.where(smoothed > 128, 255., 0.)
+
+
+class BatchRidgePreprocessor(nn.Module):
+    """Raw uint8 grayscale images (from RAW_TRANSFORM) → normalized (N, 3, size, size) model input.
+
+    Takes a batch tensor or a list of (1, H, W) images of any size. Images are
+    binarized at native resolution (same-sized ones together), then resized
+    like the Resize in main.py's transform, which matches the offline path:
+    binarize_ridge_map first, then resize.
+    """
+    def __init__(self, binarizer=None, size=224):
+        super().__init__()
+        self.binarizer = binarizer or RidgeMapBinarizer()
+        self.size = size
+        self.register_buffer("mean", torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1), persistent=False)
+        self.register_buffer("std", torch.tensor(IMAGENET_STD).view(1, 3, 1, 1), persistent=False)
+
+    def forward(self, images):
+        by_shape = defaultdict(list)
+        for i, image in enumerate(images):
+            by_shape[tuple(image.shape[-2:])].append(i)
+
+        ridge_maps = torch.empty(len(images), 1, self.size, self.size, device=self.mean.device)
+        for indices in by_shape.values():
+            ridge_map = self.binarizer(torch.stack([images[i].reshape(1, *images[i].shape[-2:]) for i in indices]))
+            # Offline maps are resized as 8-bit images, hence the rounding
+            resized = TF.resize(ridge_map, [self.size, self.size], antialias=True).round().clamp(0, 255)
+            ridge_maps[indices] = resized.to(ridge_maps.device)
+
+        ridge_maps = ridge_maps / 255.
+        return (ridge_maps.expand(-1, 3, -1, -1) - self.mean) / self.std
+
+
+class RidgeMapCollate:
+    """DataLoader collate_fn that preprocesses whole batches of RAW_TRANSFORM images.
+
+    ``DataLoader(datasets.ImageFolder(raw_root, transform=RAW_TRANSFORM),
+    collate_fn=RidgeMapCollate(RidgeMapBinarizer(clip_limit=3.0)))`` trains on
+    raw captures with any preprocessing parameters, no preprocessed_data needed.
+    """
+    def __init__(self, binarizer=None):
+        self.preprocessor = BatchRidgePreprocessor(binarizer).eval()
+
+    def __call__(self, samples):
+        images = [image for image, _ in samples]
+        labels = torch.tensor([label for _, label in samples])
+        with torch.no_grad():
+            return self.preprocessor(images), labels
+
+
+if __name__ == '__main__':
+    import time
+    import cv2
+    import numpy as np
+    from data_cleaner import binarize_ridge_map
+
+    IMAGE_PATHS = ["fingerprint.bmp", "class1_Arc_0001.png"]
+    BATCH_SIZE = 32
+    SIZE = 224
+
+    binarizer = RidgeMapBinarizer().eval()
+
+    print("="*60)
+    print(f"{'Image':<28}{'pixels differing from OpenCV':>32}")
+    print("="*60)
+    for path in IMAGE_PATHS:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            print(f"⚠️ Could not read {path}")
+            continue
+        reference = binarize_ridge_map(gray)
+        with torch.inference_mode():
+            candidate = binarizer(torch.from_numpy(gray)[None, None]).squeeze().numpy().astype(np.uint8)
+        print(f"{path:<28}{(reference != candidate).mean() * 100:>31.3f}%")
+    print("="*60)
+
+    rng = np.random.default_rng(0)
+    frames = [cv2.GaussianBlur(rng.integers(0, 256, (SIZE, SIZE), dtype=np.uint8), (5, 5), 0) for _ in range(BATCH_SIZE)]
+    batch = torch.from_numpy(np.stack(frames))[:, None]
+
+    start = time.perf_counter()
+    for frame in frames:
+        binarize_ridge_map(frame)
+    opencv_ms = (time.perf_counter() - start) * 1000.
+
+    with torch.inference_mode():
+        binarizer(batch)
+        start = time.perf_counter()
+        binarizer(batch)
+        torch_ms = (time.perf_counter() - start) * 1000.
+
+    print(f"🧵 CPU threads: {torch.get_num_threads()}")
+    print(f"⏱️ OpenCV loop:  {opencv_ms:7.1f} ms / {BATCH_SIZE} images ({BATCH_SIZE / opencv_ms * 1000:.0f} img/s)")
+    print(f"⏱️ Torch batch:  {torch_ms:7.1f} ms / {BATCH_SIZE} images ({BATCH_SIZE / torch_ms * 1000:.0f} img/s)")
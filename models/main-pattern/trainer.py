@@ -1,43 +1,100 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import Sampler
 from tqdm import tqdm
 import json
+import time
 from pathlib import Path
 from datetime import datetime
+from metrics import ConfusionMatrix
+from profiling import TrainingProfiler
+from metrics_log import MetricsWriter, HISTORY_KEYS
+
+class UnpaddedDistributedSampler(Sampler):
+    """Evaluation sampler that puts every sample on exactly one rank.
+
+    Unlike DistributedSampler it never pads with duplicates, so the summed
+    confusion matrix counts each val/test image once; ranks may see one
+    sample more or less.
+    """
+    def __init__(self, dataset, num_replicas=None, rank=None):
+        self.dataset_size = len(dataset)
+        self.num_replicas = dist.get_world_size() if num_replicas is None else num_replicas
+        self.rank = dist.get_rank() if rank is None else rank
+
+    def __iter__(self):
+        return iter(range(self.rank, self.dataset_size, self.num_replicas))
+
+    def __len__(self):
+        return len(range(self.rank, self.dataset_size, self.num_replicas))
+
 
 class Trainer:
-    def __init__(self, model, train_loader, val_loader, test_loader=None, device='cpu', lr=1e-4):
-        self.model = model.to(device)
+    def __init__(self, model, train_loader, val_loader, test_loader=None, device='cpu', lr=1e-4, distributed=False,
+                 profile=False, profile_trace_steps=None, weight_decay=0.01, lr_step_size=10, lr_gamma=0.5,
+                 output_dir="."):
         self.train_loader = train_loader
         self.val_loader = val_loader
         self.test_loader = test_loader
         self.device = device
         
+        # Distributed setup (one process per rank, launched with torchrun)
+        self.distributed = distributed
+        if self.distributed:
+            if not dist.is_initialized():
+                dist.init_process_group(backend="gloo")
+            self.rank = dist.get_rank()
+            self.world_size = dist.get_world_size()
+        else:
+            self.rank = 0
+            self.world_size = 1
+        self.is_main = self.rank == 0
+        
+        model = model.to(device)
+        self.model = DDP(model) if self.distributed else model
+        
         # Loss and optimizer
         self.criterion = nn.CrossEntropyLoss()
-        self.optimizer = optim.AdamW(self.model.parameters(), lr=lr, weight_decay=0.01)
-        self.scheduler = optim.lr_scheduler.StepLR(self.optimizer, step_size=10, gamma=0.5)
+        self.optimizer = optim.AdamW(self.model.parameters(), lr=lr, weight_decay=weight_decay)
+        self.scheduler = optim.lr_scheduler.StepLR(self.optimizer, step_size=lr_step_size, gamma=lr_gamma)
         
         self.best_val_acc = 0
         
-        # Create folders for saving models and logs
-        self.weights_folder = Path("model_weights")
-        self.weights_folder.mkdir(exist_ok=True)
+        # Label space used for accuracy/confusion, known up front so empty loaders still get a matrix
+        self.num_classes = self._infer_num_classes(model)
+        self.class_names = None
         
-        self.logs_folder = Path("training_logs")
-        self.logs_folder.mkdir(exist_ok=True)
+        # Create folders for saving models and logs (under output_dir, the working directory by default)
+        self.weights_folder = Path(output_dir) / "model_weights"
+        self.logs_folder = Path(output_dir) / "training_logs"
         
-        # Create run-specific folder
-        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Create run-specific folder (all ranks share rank 0's run id)
+        self.run_id = self._broadcast(datetime.now().strftime("%Y%m%d_%H%M%S"))
         self.run_folder = self.logs_folder / f"run_{self.run_id}"
-        self.run_folder.mkdir()
+        if self.is_main:
+            self.weights_folder.mkdir(parents=True, exist_ok=True)
+            self.logs_folder.mkdir(parents=True, exist_ok=True)
+            self.run_folder.mkdir()
         
         # File paths
         self.log_file = self.run_folder / "training_metrics.json"
+        self.metrics_stream_file = self.run_folder / "metrics.jsonl"
         self.best_model_path = self.weights_folder / f"best_model_{self.run_id}.pth"
         self.final_model_path = self.weights_folder / f"final_model_{self.run_id}.pth"
         
+        # Opt-in hot-path instrumentation (summary lands next to training_metrics.json)
+        self.profiler = TrainingProfiler(self.run_folder, device=device, enabled=profile and self.is_main,
+                                         trace_steps=profile_trace_steps)
+        
+        # Per-step metrics stream (rank 0); metrics_log.summarize rebuilds training_metrics.json from it.
+        # Opened on the first record and closed when fit/test finish, so no writer thread outlives a run
+        self.metrics_writer = None
+        self.global_step = 0
+        self.epoch = 0
+        
         # Metrics tracking
         self.metrics = {
             "train_loss": [],
@@ -46,12 +103,73 @@ class Trainer:
             "val_acc": [],
             "learning_rates": [],
             "test_acc": None,
+            "test_macro_f1": None,
+            "test_per_class": None,
+            "test_confusion_matrix": None,
             "best_epoch": 0
         }
         
-        print(f"✅ Trainer initialized")
-        print(f"📁 Models will be saved in: {self.weights_folder}")
-        print(f"📊 Logs will be saved in: {self.run_folder}")
+        self._log(f"✅ Trainer initialized")
+        if self.distributed:
+            self._log(f"🌐 Distributed training on {self.world_size} processes (gloo)")
+        self._log(f"📁 Models will be saved in: {self.weights_folder}")
+        self._log(f"📊 Logs will be saved in: {self.run_folder}")
+
+    def _log(self, message):
+        """Print only from the main process"""
+        if self.is_main:
+            print(message)
+
+    def _log_metrics(self, event, **fields):
+        """Queue a record for the metrics stream (no-op off rank 0)"""
+        if not self.is_main:
+            return
+        if self.metrics_writer is None:
+            self.metrics_writer = MetricsWriter(self.metrics_stream_file)
+        self.metrics_writer.log(event, **fields)
+
+    def close_metrics(self):
+        """Flush and close the metrics stream (reopened in append mode if more is logged)"""
+        if self.metrics_writer is not None:
+            self.metrics_writer.close()
+            self.metrics_writer = None
+
+    def _broadcast(self, obj):
+        """Share a picklable value from rank 0 with every rank"""
+        if not self.distributed:
+            return obj
+        payload = [obj]
+        dist.broadcast_object_list(payload, src=0)
+        return payload[0]
+
+    def _all_reduce(self, *values):
+        """Sum scalar statistics across ranks"""
+        if not self.distributed:
+            return values
+        stats = torch.tensor(values, dtype=torch.float64)
+        dist.all_reduce(stats, op=dist.ReduceOp.SUM)
+        return tuple(stats.tolist())
+
+    def _infer_num_classes(self, model):
+        """Output classes of the model: its num_classes, else the training classes, else the last Linear layer"""
+        if getattr(model, "num_classes", None):
+            return model.num_classes
+        classes = getattr(getattr(self.train_loader, "dataset", None), "classes", None)
+        if classes:
+            return len(classes)
+        linears = [module for module in model.modules() if isinstance(module, nn.Linear)]
+        return linears[-1].out_features
+
+    def _unwrapped_model(self):
+        """Return the bare model so checkpoints load without the DDP 'module.' prefix"""
+        return self.model.module if self.distributed else self.model
+
+    def _set_epoch(self, epoch):
+        """Reshuffle distributed samplers differently every epoch"""
+        for loader in (self.train_loader, self.val_loader):
+            sampler = getattr(loader, "sampler", None)
+            if hasattr(sampler, "set_epoch"):
+                sampler.set_epoch(epoch)
 
     def train_epoch(self):
         self.model.train()
@@ -59,66 +177,114 @@ class Trainer:
         correct = 0
         total = 0
         
-        progress_bar = tqdm(self.train_loader, desc="Training", leave=False)
-        for batch_idx, (images, labels) in enumerate(progress_bar):
-            images, labels = images.to(self.device), labels.to(self.device)
+        profiler = self.profiler
+        progress_bar = tqdm(self.train_loader, desc="Training", leave=False, disable=not self.is_main)
+        step_start = time.perf_counter()
+        for batch_idx, (images, labels) in enumerate(profiler.iter_batches(progress_bar)):
+            with profiler.phase("to_device"):
+                images, labels = images.to(self.device), labels.to(self.device)
             
             # Forward pass
-            self.optimizer.zero_grad()
-            outputs = self.model(images)
-            loss = self.criterion(outputs, labels)
+            with profiler.phase("forward"):
+                self.optimizer.zero_grad()
+                outputs = self.model(images)
+                loss = self.compute_loss(images, outputs, labels)
             
             # Backward pass
-            loss.backward()
-            self.optimizer.step()
+            with profiler.phase("backward"):
+                loss.backward()
+            with profiler.phase("optimizer"):
+                self.optimizer.step()
             
             # Statistics
-            running_loss += loss.item()
-            _, predicted = outputs.max(1)
-            correct += predicted.eq(labels).sum().item()
-            total += labels.size(0)
+            with profiler.phase("statistics"):
+                step_loss = loss.item()
+                running_loss += step_loss
+                predicted, targets = self.predictions(outputs, labels)
+                correct += predicted.eq(targets).sum().item()
+                total += labels.size(0)
+                
+                now = time.perf_counter()
+                self.global_step += 1
+                self._log_metrics("step", epoch=self.epoch, step=self.global_step, loss=step_loss,
+                                  batch_size=labels.size(0), samples_per_sec=labels.size(0) / (now - step_start),
+                                  lr=self.optimizer.param_groups[0]['lr'])
+                step_start = now
             
             # Update progress bar
-            current_acc = 100. * correct / total
-            progress_bar.set_postfix({
-                'Loss': f'{loss.item():.4f}',
-                'Acc': f'{current_acc:.2f}%'
-            })
+            with profiler.phase("progress_bar"):
+                current_acc = 100. * correct / total
+                progress_bar.set_postfix({
+                    'Loss': f'{loss.item():.4f}',
+                    'Acc': f'{current_acc:.2f}%'
+                })
+            profiler.step(labels.size(0))
         
-        epoch_loss = running_loss / len(self.train_loader)
+        running_loss, correct, total, batches = self._all_reduce(
+            running_loss, correct, total, len(self.train_loader))
+        epoch_loss = running_loss / batches
         epoch_acc = 100. * correct / total
         return epoch_loss, epoch_acc
 
-    def validate_epoch(self):
-        self.model.eval()
-        running_loss = 0.0
-        correct = 0
-        total = 0
+    def compute_loss(self, images, outputs, labels):
+        """Training loss for one batch (overridden by DistillationTrainer)"""
+        return self.criterion(outputs, labels)
+
+    def predictions(self, outputs, labels):
+        """Map model outputs and loader labels to (predicted, target) class indices"""
+        return outputs.argmax(1), labels
+
+    def evaluate(self, loader, desc="Evaluating", leave=False, model=None):
+        """Run the model over a loader, returning mean loss and an on-device confusion matrix.
+
+        Under DDP pass loaders with an UnpaddedDistributedSampler: shards can
+        differ by a batch, so the bare model is used (no per-forward collectives)
+        and only the exact totals are summed across ranks.
+        """
+        model = self._unwrapped_model() if model is None else model
+        model.eval()
+        running_loss = torch.zeros((), dtype=torch.float64, device=self.device)
+        confusion = ConfusionMatrix(self.num_classes, device=self.device)
         
         with torch.no_grad():
-            for images, labels in tqdm(self.val_loader, desc="Validating", leave=False):
+            for images, labels in tqdm(loader, desc=desc, leave=leave, disable=not self.is_main):
                 images, labels = images.to(self.device), labels.to(self.device)
                 
-                outputs = self.model(images)
-                loss = self.criterion(outputs, labels)
-                
-                running_loss += loss.item()
-                _, predicted = outputs.max(1)
-                correct += predicted.eq(labels).sum().item()
-                total += labels.size(0)
+                outputs = model(images)
+                running_loss += self.criterion(outputs, labels)
+                confusion.update(*self.predictions(outputs, labels))
+        
+        # Only sync with the host (and other ranks) once per pass
+        if self.distributed:
+            dist.all_reduce(running_loss, op=dist.ReduceOp.SUM)
+            dist.all_reduce(confusion.matrix, op=dist.ReduceOp.SUM)
+        _, batches = self._all_reduce(0, len(loader))
         
-        val_loss = running_loss / len(self.val_loader)
-        val_acc = 100. * correct / total
+        return running_loss.item() / max(batches, 1), confusion
+
+    def validate_epoch(self):
+        val_loss, confusion = self.evaluate(self.val_loader, desc="Validating")
+        val_acc = confusion.accuracy
         return val_loss, val_acc
 
     def fit(self, epochs=20):
-        print(f"\n🚀 Starting training for {epochs} epochs...")
+        try:
+            self._fit(epochs)
+        finally:
+            self.close_metrics()
+
+    def _fit(self, epochs):
+        self._log(f"\n🚀 Starting training for {epochs} epochs...")
         
         for epoch in range(1, epochs + 1):
-            print(f"\n📊 Epoch {epoch}/{epochs}")
+            self._log(f"\n📊 Epoch {epoch}/{epochs}")
+            self.epoch = epoch
+            self._set_epoch(epoch)
             
             # Training
+            self.profiler.start_epoch(epoch)
             train_loss, train_acc = self.train_epoch()
+            profile_summary = self.profiler.end_epoch()
             
             # Validation
             val_loss, val_acc = self.validate_epoch()
@@ -135,93 +301,101 @@ class Trainer:
             self.metrics["learning_rates"].append(current_lr)
             
             # Print epoch results
-            print(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}%")
-            print(f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%")
-            print(f"Learning Rate: {current_lr:.6f}")
+            self._log(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}%")
+            self._log(f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%")
+            self._log(f"Learning Rate: {current_lr:.6f}")
+            if profile_summary is not None:
+                self._log(self.profiler.format_summary(profile_summary))
+                self.profiler.save()
             
             # Save best model
             if val_acc > self.best_val_acc:
                 self.best_val_acc = val_acc
                 self.metrics["best_epoch"] = epoch
-                torch.save({
-                    'epoch': epoch,
-                    'model_state_dict': self.model.state_dict(),
-                    'optimizer_state_dict': self.optimizer.state_dict(),
-                    'val_acc': val_acc,
-                    'train_acc': train_acc
-                }, self.best_model_path)
-                print(f"✅ New best model saved! Val Acc: {val_acc:.2f}%")
+                if self.is_main:
+                    torch.save({
+                        'epoch': epoch,
+                        'model_state_dict': self._unwrapped_model().state_dict(),
+                        'optimizer_state_dict': self.optimizer.state_dict(),
+                        'val_acc': val_acc,
+                        'train_acc': train_acc,
+                        'class_names': self._class_names()
+                    }, self.best_model_path)
+                self._log(f"✅ New best model saved! Val Acc: {val_acc:.2f}%")
             
-            # Save metrics after each epoch
-            self._save_metrics()
+            # Stream the epoch summary; the full JSON is only rewritten at the end of the run
+            self._log_metrics("epoch", epoch=epoch, train_loss=train_loss, train_acc=train_acc,
+                              val_loss=val_loss, val_acc=val_acc, lr=current_lr,
+                              best_epoch=self.metrics["best_epoch"])
+        
+        self._save_metrics()
         
         # Save final model
-        torch.save({
-            'epoch': epochs,
-            'model_state_dict': self.model.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
-            'final_val_acc': val_acc,
-            'best_val_acc': self.best_val_acc
-        }, self.final_model_path)
-        
-        print(f"\n🎯 Training completed!")
-        print(f"📈 Best validation accuracy: {self.best_val_acc:.2f}% (Epoch {self.metrics['best_epoch']})")
-        print(f"💾 Best model saved at: {self.best_model_path}")
-        print(f"💾 Final model saved at: {self.final_model_path}")
+        if self.is_main:
+            torch.save({
+                'epoch': epochs,
+                'model_state_dict': self._unwrapped_model().state_dict(),
+                'optimizer_state_dict': self.optimizer.state_dict(),
+                'final_val_acc': val_acc,
+                'best_val_acc': self.best_val_acc,
+                'class_names': self._class_names()
+            }, self.final_model_path)
+        
+        # Other ranks must not read checkpoints before rank 0 has written them
+        if self.distributed:
+            dist.barrier()
+        
+        self._log(f"\n🎯 Training completed!")
+        self._log(f"📈 Best validation accuracy: {self.best_val_acc:.2f}% (Epoch {self.metrics['best_epoch']})")
+        self._log(f"💾 Best model saved at: {self.best_model_path}")
+        self._log(f"💾 Final model saved at: {self.final_model_path}")
+
+    def _class_names(self):
+        """Label order of the model's outputs, stored in checkpoints so inference can check it"""
+        if self.class_names is not None:
+            return list(self.class_names)
+        classes = getattr(getattr(self.train_loader, "dataset", None), "classes", None)
+        return list(classes) if classes is not None else None
 
     def test(self):
         if self.test_loader is None:
-            print("⚠️ No test loader provided.")
+            self._log("⚠️ No test loader provided.")
             return None
         
         # Load best model for testing
         checkpoint = torch.load(self.best_model_path, map_location=self.device)
-        self.model.load_state_dict(checkpoint['model_state_dict'])
+        self._unwrapped_model().load_state_dict(checkpoint['model_state_dict'])
         
-        print(f"\n🧪 Testing with best model (Epoch {checkpoint['epoch']})...")
+        self._log(f"\n🧪 Testing with best model (Epoch {checkpoint['epoch']})...")
         
-        self.model.eval()
-        correct = 0
-        total = 0
-        class_correct = {}
-        class_total = {}
+        _, confusion = self.evaluate(self.test_loader, desc="Testing", leave=True)
+        class_names = self._class_names() or getattr(getattr(self.test_loader, "dataset", None), "classes", None)
+        report = confusion.compute(class_names)
         
-        with torch.no_grad():
-            for images, labels in tqdm(self.test_loader, desc="Testing"):
-                images, labels = images.to(self.device), labels.to(self.device)
-                outputs = self.model(images)
-                _, predicted = outputs.max(1)
-                
-                total += labels.size(0)
-                correct += predicted.eq(labels).sum().item()
-                
-                # Per-class accuracy
-                for label, pred in zip(labels, predicted):
-                    label_item = label.item()
-                    if label_item not in class_correct:
-                        class_correct[label_item] = 0
-                        class_total[label_item] = 0
-                    
-                    class_total[label_item] += 1
-                    if label_item == pred.item():
-                        class_correct[label_item] += 1
-        
-        test_acc = 100. * correct / total
+        test_acc = report["accuracy"]
         self.metrics["test_acc"] = test_acc
+        self.metrics["test_macro_f1"] = report["macro_f1"]
+        self.metrics["test_per_class"] = report["per_class"]
+        self.metrics["test_confusion_matrix"] = report["confusion_matrix"]
         
         # Print results
-        print(f"\n🎯 Test Results:")
-        print(f"Overall Test Accuracy: {test_acc:.2f}%")
+        self._log(f"\n🎯 Test Results:")
+        self._log(f"Overall Test Accuracy: {test_acc:.2f}% (Macro F1: {report['macro_f1']:.4f})")
         
         # Per-class results
-        for class_idx in sorted(class_correct.keys()):
-            class_acc = 100. * class_correct[class_idx] / class_total[class_idx]
-            print(f"Class {class_idx} Accuracy: {class_acc:.2f}% ({class_correct[class_idx]}/{class_total[class_idx]})")
+        for class_name, stats in report["per_class"].items():
+            self._log(f"Class {class_name}: Precision {stats['precision']:.4f}, Recall {stats['recall']:.4f}, "
+                      f"F1 {stats['f1']:.4f} ({stats['correct']}/{stats['support']})")
         
         self._save_metrics()
         return test_acc
 
     def _save_metrics(self):
-        """Save metrics to JSON file"""
+        """Save metrics to JSON file (and their non-history part to the metrics stream)"""
+        if not self.is_main:
+            return
+        self._log_metrics("metrics", **{key: value for key, value in self.metrics.items()
+                                        if key not in HISTORY_KEYS})
+        self.close_metrics()
         with open(self.log_file, 'w') as f:
             json.dump(self.metrics, f, indent=4)